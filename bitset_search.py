@@ -0,0 +1,91 @@
+from collections import deque
+
+
+# Every taxi state holds exactly one fact with this prefix, so operators can be
+# looked up by it instead of being tested one by one.
+ANCHOR_PREFIX = '(taxi-at '
+
+
+class BitsetTask:
+    """A grounded pyperplan Task with facts interned as bits of a Python int.
+
+    Each operator becomes (pre_mask, add_mask, keep_mask, op), where keep_mask
+    is the complement of its delete list, so applicability is one AND and
+    application is one AND plus one OR. Operators are bucketed by their
+    taxi-at precondition; the bucket for a state is found with a single mask
+    of that state.
+    """
+
+    def __init__(self, task, anchor_prefix=ANCHOR_PREFIX):
+        self.task = task
+        self.facts = sorted(task.facts)
+        self.index = {fact: i for i, fact in enumerate(self.facts)}
+
+        self.anchor_mask = self.mask(f for f in self.facts if f.startswith(anchor_prefix))
+        self.initial_state = self.mask(task.initial_state)
+        self.goal_mask = self.mask(task.goals)
+
+        self.by_anchor = {}
+        self.unanchored = []
+        for op in task.operators:
+            pre = self.mask(op.preconditions)
+            entry = (pre, self.mask(op.add_effects), ~self.mask(op.del_effects), op)
+            anchor = pre & self.anchor_mask
+            if anchor and anchor & (anchor - 1) == 0:
+                self.by_anchor.setdefault(anchor, []).append(entry)
+            else:
+                self.unanchored.append(entry)
+
+    def mask(self, facts):
+        bits = 0
+        for fact in facts:
+            bits |= 1 << self.index[fact]
+        return bits
+
+    def state_facts(self, state):
+        return frozenset(fact for i, fact in enumerate(self.facts) if state >> i & 1)
+
+    def goal_reached(self, state):
+        return state & self.goal_mask == self.goal_mask
+
+    def successors(self, state):
+        candidates = self.by_anchor.get(state & self.anchor_mask, ())
+        for entries in (candidates, self.unanchored):
+            for pre, add, keep, op in entries:
+                if state & pre == pre:
+                    yield op, (state & keep) | add
+
+
+def bitset_bfs(task):
+    """Breadth-first search over bitset states.
+
+    All taxi operators cost 1, so the first plan found is optimal. Returns a
+    list of pyperplan Operators like pyperplan's searches, or None.
+    """
+    btask = task if isinstance(task, BitsetTask) else BitsetTask(task)
+    start = btask.initial_state
+    if btask.goal_reached(start):
+        return []
+
+    parents = {start: None}
+    queue = deque([start])
+
+    while queue:
+        state = queue.popleft()
+        for op, succ in btask.successors(state):
+            if succ in parents:
+                continue
+            parents[succ] = (state, op)
+
+            if btask.goal_reached(succ):
+                solution = []
+                node = succ
+                while parents[node] is not None:
+                    node, step = parents[node]
+                    solution.append(step)
+                solution.reverse()
+                return solution
+
+            queue.append(succ)
+
+    return None
@@ -1,62 +1,109 @@
 import gymnasium as gym
 import os
 import tempfile
-from pyperplan_wrapper import plan
+from pyperplan_wrapper import plan, HeuristicCache
+from taxi_grid_env import decode_obs, get_layout
+from taxi_map import get_map
+from optimality import episode_gap, optimal_cost
+from profiling import profiled
+from step_stream import StepRecord, run_to_end
+from streaming_stats import EPISODE_HEADER, LatencyHistogram, StreamingAggregator
 import time
 import csv
 
 
 class SimpleTaxiPlanner:
-    LOCATIONS = {'R': (0, 0), 'G': (0, 4), 'Y': (4, 0), 'B': (4, 3)}
-    LOC_NAMES = ['R', 'G', 'Y', 'B']
 
-    def __init__(self, domain_file='taxi_domain.pddl'):
+    def __init__(self, domain_file='taxi_domain.pddl', env_id='Taxi-v3', env_kwargs=None,
+                 grounding='pyperplan', backend='pyperplan', heuristic_cache_size=100000,
+                 profiler=None, recorder=None, validator=None, checker=None, macros=None):
         self.domain_file = domain_file
         self.env = None
+        # Any Taxi-v3 compatible env, e.g. 'GridTaxi-v0' from taxi_grid_env
+        self.env_id = env_id
+        self.env_kwargs = env_kwargs or {}
+        # 'pyperplan' or 'compact' (see taxi_grounding.ground_compact)
+        self.grounding = grounding
+        # 'pyperplan' (A* with hFF) or 'bitset' (see bitset_search.bitset_bfs)
+        self.backend = backend
+        # hFF values memoized across the replans of one episode; None disables it
+        self.heuristic_cache_size = heuristic_cache_size
+        self.heuristic_cache = None
+        # Latency of each plan call of the current episode
+        self.plan_latencies = LatencyHistogram()
+        # Optional profiling.EpisodeProfiler
+        self.profiler = profiler
+        # Optional trajectory_log.TrajectoryRecorder
+        self.recorder = recorder
+        # Optional plan_validator.PlanValidator, checks lazy plans before executing them
+        self.validator = validator
+        # Fewest actions that solve the current episode (optimality.optimal_cost)
+        self.optimal_cost = None
+        # Optional optimality.PlanChecker, compares every plan with the optimal cost
+        self.checker = checker
+        # Optional macros.MacroLibrary: records the first plan of each episode, and its learned macros join each task
+        self.macros = macros
+        # Whether the current episode's plan has been recorded in macros
+        self.macro_plan_recorded = False
+
+    def make_env(self, **kwargs):
+        return gym.make(self.env_id, **{**self.env_kwargs, **kwargs})
+
+    def start_episode(self, **env_kwargs):
+        self.env = self.make_env(**env_kwargs)
+        self.plan_latencies = LatencyHistogram()
+        self.macro_plan_recorded = False
+        if self.heuristic_cache_size:
+            self.heuristic_cache = HeuristicCache(self.heuristic_cache_size)
+        return self.env
+
+    def plan_problem(self, problem_file):
+        # All pickup sites of the layout, so every replan in an episode grounds the same operators
+        sites = [f"loc-{r}-{c}" for r, c in get_layout(self.env).locs]
+        return plan(self.domain_file, problem_file, grounding=self.grounding, sites=sites,
+                    backend=self.backend, heuristic_cache=self.heuristic_cache, macros=self.macros)
+
+    def first_step_length(self, plan_result):
+        """Primitive actions in the first step of a plan: more than one if it is a macro."""
+        if self.macros is None:
+            return 1
+        return len(self.macros.macros.get(plan_result[0].name, ())) or 1
+
+    def plan_actions(self, plan_result):
+        """Operator names of a plan, with any macro expanded into its primitive steps."""
+        names = [a.name if hasattr(a, 'name') else str(a) for a in plan_result]
+        if self.macros is not None:
+            names = self.macros.expand(names)
+            # Replans repeat the rest of the same route (Run-Lookahead replans every step), so
+            # only the episode's first plan is recorded and support counts episodes, not replans
+            if not self.macro_plan_recorded:
+                self.macros.record(names)
+                self.macro_plan_recorded = True
+        return names
 
     def make_problem(self, obs):
-        taxi_row, taxi_col, pass_loc, dest_idx = self.env.unwrapped.decode(obs)
-
-        # walls = set()  
-        walls = {
-            ((0, 0), (0, 1)), ((0, 1), (0, 0)),  # Vertical wall right of R
-            ((1, 0), (1, 1)), ((1, 1), (1, 0)),
-            ((0, 2), (0, 3)), ((0, 3), (0, 2)),  # Vertical wall right of column 2
-            ((1, 2), (1, 3)), ((1, 3), (1, 2)),
-            ((3, 0), (3, 1)), ((3, 1), (3, 0)),  # Vertical wall right of column 0
-            ((4, 0), (4, 1)), ((4, 1), (4, 0)),
-            ((3, 2), (3, 3)), ((3, 3), (3, 2)),  # Vertical wall right of column 2
-            ((4, 2), (4, 3)), ((4, 3), (4, 2)),
-        }
+        layout = get_layout(self.env)
+        (taxi_row, taxi_col), passenger_loc, (dr, dc), _ = decode_obs(self.env, obs)
+        num_rows, num_cols = layout.num_rows, layout.num_columns
 
         pddl = "(define (problem taxi-simple)\n (:domain taxi)\n"
         pddl += "   (:objects taxi1 - taxi passenger1 - passenger\n"
 
-        for i in range(5):
-            for j in range(5):
+        for i in range(num_rows):
+            for j in range(num_cols):
                 pddl += f"   loc-{i}-{j} - location\n"
         pddl += "  )\n  (:init\n"
 
         pddl += f"    (taxi-at taxi1 loc-{taxi_row}-{taxi_col})\n"
-        if pass_loc == 4:
+        if passenger_loc is None:
             pddl += "    (in-taxi passenger1 taxi1)\n"
         else:
-            pr, pc = self.LOCATIONS[self.LOC_NAMES[pass_loc]]
+            pr, pc = passenger_loc
             pddl += f"    (passenger-at passenger1 loc-{pr}-{pc})\n"
 
-        dr, dc = self.LOCATIONS[self.LOC_NAMES[dest_idx]]
         pddl += f"    (destination passenger1 loc-{dr}-{dc})\n"
 
-        for i in range(5):
-            for j in range(5):
-                if i > 0 and ((i, j), (i - 1, j)) not in walls:
-                    pddl += f"    (north loc-{i}-{j} loc-{i - 1}-{j})\n"
-                if i < 4 and ((i, j), (i + 1, j)) not in walls:
-                    pddl += f"    (south loc-{i}-{j} loc-{i + 1}-{j})\n"
-                if j > 0 and ((i, j), (i, j - 1)) not in walls:
-                    pddl += f"    (west loc-{i}-{j} loc-{i}-{j - 1})\n"
-                if j < 4 and ((i, j), (i, j + 1)) not in walls:
-                    pddl += f"    (east loc-{i}-{j} loc-{i}-{j + 1})\n"
+        pddl += get_map(layout).pddl_adjacency
 
         pddl += f"  )\n  (:goal (passenger-at passenger1 loc-{dr}-{dc}))\n)\n"
         return pddl
@@ -84,15 +131,22 @@ class SimpleTaxiPlanner:
 
     def decode_state(self, obs):
         """Decode observation into human-readable format"""
-        taxi_row, taxi_col, pass_loc, dest_idx = self.env.unwrapped.decode(obs)
-        pass_loc_str = self.LOC_NAMES[pass_loc] if pass_loc < 4 else "in-taxi"
-        dest_str = self.LOC_NAMES[dest_idx]
-        return f"Taxi:({taxi_row},{taxi_col}) Pass:{pass_loc_str} Dest:{dest_str}"
-
-    def run_episode_visual(self, seed=None, verbose=True, delay=0.5):
-        """Visual version with rendering"""
-        self.env = gym.make('Taxi-v3', render_mode='human')
+        taxi_pos, passenger_loc, destination, _ = decode_obs(self.env, obs)
+        pass_loc_str = passenger_loc if passenger_loc is not None else "in-taxi"
+        return f"Taxi:{taxi_pos} Pass:{pass_loc_str} Dest:{destination}"
+
+    @profiled('Classical-Visual')
+    def run_episode_visual(self, seed=None, verbose=True, delay=0.5, max_steps=200, frames=None):
+        """Visual version with rendering
+
+        With frames (a frame_recorder.FrameRecorder) nothing is shown and
+        there is no delay: frames are written in the background instead, so
+        this also runs on headless machines.
+        """
+        self.start_episode(render_mode='human' if frames is None else None)
         obs, _ = self.env.reset(seed=seed)
+        if frames is not None:
+            frames.start_episode('Classical-Visual', seed, self.env_id, self.env_kwargs, obs)
 
         if verbose:
             print(f"Initial state: {self.decode_state(obs)}")
@@ -109,7 +163,7 @@ class SimpleTaxiPlanner:
         terminated = False  
         reward = 0  
 
-        while not done and steps < 200:
+        while not done and steps < max_steps:
             # Generate new plan if needed
             if not current_plan:
                 problem_str = self.make_problem(obs)
@@ -122,7 +176,7 @@ class SimpleTaxiPlanner:
                     problem_file = f.name
 
                 try:
-                    plan_result = plan(self.domain_file, problem_file)
+                    plan_result = self.plan_problem(problem_file)
                     os.unlink(problem_file)
 
                     if not plan_result:
@@ -130,8 +184,7 @@ class SimpleTaxiPlanner:
                             print("ERROR: No plan found!")
                         break
 
-                    current_plan = [a.name if hasattr(a, 'name') else str(a)
-                                    for a in plan_result]
+                    current_plan = self.plan_actions(plan_result)
                     plan_count += 1
 
                     if verbose:
@@ -143,6 +196,8 @@ class SimpleTaxiPlanner:
                     os.unlink(problem_file)
                     success = False
                     self.env.close()
+                    if frames is not None:
+                        frames.end_episode()
                     return success, steps, plan_count, total_reward
 
             
@@ -163,7 +218,10 @@ class SimpleTaxiPlanner:
             if verbose:
                 print(f"Before: {old_state} | After: {new_state} | Reward: {reward}")
 
-            time.sleep(delay)
+            if frames is not None:
+                frames.step(obs, gym_action, reward, 0.0, terminated, truncated)
+            else:
+                time.sleep(delay)
 
             total_reward += reward
             steps += 1
@@ -182,189 +240,226 @@ class SimpleTaxiPlanner:
 
         success = terminated and reward > 0
         self.env.close()
+        if frames is not None:
+            frames.end_episode()
             
 
         return success, steps, plan_count, total_reward
 
-    def run_episode(self, seed=None, verbose=False):
+    @profiled('Classical-Run-Lazy-Lookahead')
+    def run_episode(self, seed=None, verbose=False, max_steps=200):
         """Non-visual version for batch testing"""
-        self.env = gym.make('Taxi-v3')
-        obs, _ = self.env.reset(seed=seed)
-
-        done = False
-        total_reward = 0
-        steps = 0
-        plan_count = 0
-        current_plan = []
-        consecutive_failures = 0
-        MAX_CONSECUTIVE_FAILURES = 3
-        terminated = False
-        reward = 0
-
-        total_planning_time = 0
-        actions_planned = 0
-        actions_executed = 0
-
-        while not done and steps < 200:
-            if not current_plan:
-                if verbose:
-                    print(f"[Step {steps}] Planning...")
-                problem_str = self.make_problem(obs)
-
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.pddl', delete=False) as f:
-                    f.write(problem_str)
-                    problem_file = f.name
-
-                try:
-                    planning_start = time.time()
-                    plan_result = plan(self.domain_file, problem_file)
-                    planning_time = time.time() - planning_start
-                    total_planning_time += planning_time
-                    os.unlink(problem_file)
+        return run_to_end(self.iter_episode(seed, verbose, max_steps))
+
+    def iter_episode(self, seed=None, verbose=False, max_steps=200):
+        """run_episode as a generator of step_stream.StepRecords; returns the result tuple."""
+        self.start_episode()
+        try:
+            obs, _ = self.env.reset(seed=seed)
+            self.optimal_cost = optimal_cost(self.env, obs)
+            if self.recorder is not None:
+                self.recorder.start_episode('Classical-Run-Lazy-Lookahead', seed, self.env_id, self.env_kwargs, obs)
+
+            done = False
+            total_reward = 0
+            steps = 0
+            plan_count = 0
+            current_plan = []
+            consecutive_failures = 0
+            MAX_CONSECUTIVE_FAILURES = 3
+            terminated = False
+            reward = 0
+
+            total_planning_time = 0
+            actions_planned = 0
+            actions_executed = 0
+
+            while not done and steps < max_steps:
+                planning_time = 0.0
+                replanned = not current_plan
+                if not current_plan:
+                    if verbose:
+                        print(f"[Step {steps}] Planning...")
+                    problem_str = self.make_problem(obs)
+
+                    with tempfile.NamedTemporaryFile(mode='w', suffix='.pddl', delete=False) as f:
+                        f.write(problem_str)
+                        problem_file = f.name
+
+                    try:
+                        planning_start = time.time()
+                        plan_result = self.plan_problem(problem_file)
+                        planning_time = time.time() - planning_start
+                        self.plan_latencies.add(planning_time)
+                        total_planning_time += planning_time
+                        os.unlink(problem_file)
 
-                    if not plan_result:
-                        if verbose:
-                            print("No plan found!")
-                        break
+                        if not plan_result:
+                            if verbose:
+                                print("No plan found!")
+                            break
 
-                    current_plan = [a.name if hasattr(a, 'name') else str(a)
-                                    for a in plan_result]
+                        current_plan = self.plan_actions(plan_result)
                     
                     
-                    if not current_plan:
-                        break
+                        if not current_plan:
+                            break
                     
-                    actions_planned += len(current_plan)
-                    plan_count += 1
-
-                except Exception as e:
+                        actions_planned += len(current_plan)
+                        plan_count += 1
+                        if self.checker is not None:
+                            self.checker.check(self.env, obs, len(current_plan),
+                                               f"Classical-{self.grounding}-{self.backend}")
+
+                        if self.validator is not None:
+                            legal = self.validator.valid_prefix(
+                                self.env, obs, [self.pddl_to_gym_action(a) for a in current_plan],
+                                f"Classical-{self.grounding}-{self.backend}")
+                            # Execute up to the first illegal action, then replan from there
+                            current_plan = current_plan[:legal]
+                            if not current_plan:
+                                if verbose:
+                                    print("Plan rejected at its first action!")
+                                break
+
+                    except Exception as e:
+                        if verbose:
+                            print(f"Planning error: {e}")
+                        if os.path.exists(problem_file):
+                            os.unlink(problem_file)
+                        break
+            
+                # Safety check before popping
+                if not current_plan:
                     if verbose:
-                        print(f"Planning error: {e}")
-                    if os.path.exists(problem_file):
-                        os.unlink(problem_file)
+                        print(f"Error: current_plan is empty at step {steps}")
                     break
-            
-            # Safety check before popping
-            if not current_plan:
-                if verbose:
-                    print(f"Error: current_plan is empty at step {steps}")
-                break
-
-            action_name = current_plan.pop(0)
-            gym_action = self.pddl_to_gym_action(action_name)
-
-            old_state = tuple(self.env.unwrapped.decode(obs))
-            obs, reward, terminated, truncated, _ = self.env.step(gym_action)
-            new_state = tuple(self.env.unwrapped.decode(obs))
 
-            total_reward += reward
-            steps += 1
-            actions_executed += 1
-            done = terminated or truncated
+                action_name = current_plan.pop(0)
+                gym_action = self.pddl_to_gym_action(action_name)
 
-            # Check if state changed
-            if old_state == new_state and not done:
-                consecutive_failures += 1
-                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
-                    current_plan = []
+                old_state = tuple(self.env.unwrapped.decode(obs))
+                obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+                if self.recorder is not None:
+                    self.recorder.step(obs, gym_action, reward, planning_time, terminated, truncated)
+                yield StepRecord(obs, gym_action, reward, planning_time, replanned)
+                new_state = tuple(self.env.unwrapped.decode(obs))
+
+                total_reward += reward
+                steps += 1
+                actions_executed += 1
+                done = terminated or truncated
+
+                # Check if state changed
+                if old_state == new_state and not done:
+                    consecutive_failures += 1
+                    if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                        current_plan = []
+                        consecutive_failures = 0
+                else:
                     consecutive_failures = 0
-            else:
-                consecutive_failures = 0
-
-        success = terminated and reward > 0
-        self.env.close()
 
-        fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
+            success = terminated and reward > 0
 
-        return success, steps, plan_count, total_reward, total_planning_time, fidelity
+            if verbose and self.heuristic_cache is not None:
+                print(f"Heuristic cache: {self.heuristic_cache}")
 
-    def run_episode_lookahead(self, seed=None, verbose=False):
-        """Classical Planning with Run-Lookahead (replan every step)"""
-        self.env = gym.make('Taxi-v3')
-        obs, _ = self.env.reset(seed=seed)
-
-        done = False
-        total_reward = 0
-        steps = 0
-        plan_count = 0
-        terminated = False
-        reward = 0
-
-        total_planning_time = 0
-        actions_planned = 0
-        actions_executed = 0
-
-        while not done and steps < 200:
-            
-            problem_str = self.make_problem(obs)
+            fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
 
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.pddl', delete=False) as f:
-                f.write(problem_str)
-                problem_file = f.name
+            return success, steps, plan_count, total_reward, total_planning_time, fidelity
+        finally:
+            self.env.close()
+            if self.recorder is not None:
+                self.recorder.end_episode()
 
-            try:
-                planning_start = time.time()
-                plan_result = plan(self.domain_file, problem_file)
-                planning_time = time.time() - planning_start
-                total_planning_time += planning_time
-                os.unlink(problem_file)
-
-                if not plan_result:
-                    break
-
-                plan_count += 1
-                actions_planned += len(plan_result)
-
-                # Execute ONLY first action (Run-Lookahead)
-                action = plan_result[0]
-                action_name = action.name if hasattr(action, 'name') else str(action)
-                gym_action = self.pddl_to_gym_action(action_name)
-
-            except Exception as e:
-                if verbose:
-                    print(f"Planning error: {e}")
-                if os.path.exists(problem_file):
-                    os.unlink(problem_file)
-                break
-
-            obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+    @profiled('Classical-Run-Lookahead')
+    def run_episode_lookahead(self, seed=None, verbose=False, max_steps=200):
+        """Classical Planning with Run-Lookahead (replan every step)"""
+        return run_to_end(self.iter_episode_lookahead(seed, verbose, max_steps))
+
+    def iter_episode_lookahead(self, seed=None, verbose=False, max_steps=200):
+        """run_episode_lookahead as a generator of step_stream.StepRecords; returns the result tuple."""
+        self.start_episode()
+        try:
+            obs, _ = self.env.reset(seed=seed)
+            self.optimal_cost = optimal_cost(self.env, obs)
+            if self.recorder is not None:
+                self.recorder.start_episode('Classical-Run-Lookahead', seed, self.env_id, self.env_kwargs, obs)
+
+            done = False
+            total_reward = 0
+            steps = 0
+            plan_count = 0
+            terminated = False
+            reward = 0
+
+            total_planning_time = 0
+            actions_planned = 0
+            actions_executed = 0
+            step_actions = []
+
+            while not done and steps < max_steps:
+                planning_time = 0.0
+                replanned = not step_actions
+                if not step_actions:
+                    problem_str = self.make_problem(obs)
+
+                    with tempfile.NamedTemporaryFile(mode='w', suffix='.pddl', delete=False) as f:
+                        f.write(problem_str)
+                        problem_file = f.name
+
+                    try:
+                        planning_start = time.time()
+                        plan_result = self.plan_problem(problem_file)
+                        planning_time = time.time() - planning_start
+                        self.plan_latencies.add(planning_time)
+                        total_planning_time += planning_time
+                        os.unlink(problem_file)
 
-            total_reward += reward
-            steps += 1
-            actions_executed += 1
-            done = terminated or truncated
+                        if not plan_result:
+                            break
 
-        success = terminated and reward > 0
-        self.env.close()
+                        plan_actions = self.plan_actions(plan_result)
+                        plan_count += 1
+                        actions_planned += len(plan_actions)
+                        if self.checker is not None:
+                            self.checker.check(self.env, obs, len(plan_actions),
+                                               f"Classical-{self.grounding}-{self.backend}")
 
-        fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
+                        # Execute ONLY the first step (Run-Lookahead); a macro step is all of its actions
+                        step_actions = plan_actions[:self.first_step_length(plan_result)]
 
-        return success, steps, plan_count, total_reward, total_planning_time, fidelity
+                    except Exception as e:
+                        if verbose:
+                            print(f"Planning error: {e}")
+                        if os.path.exists(problem_file):
+                            os.unlink(problem_file)
+                        break
 
+                gym_action = self.pddl_to_gym_action(step_actions.pop(0))
 
-def export_both_to_csv(lazy_results, lookahead_results, filename="classical_results.csv"):
-    """Export both classical planning strategies to CSV matching HTN format"""
-    with open(filename, "w", newline='') as f:
-        writer = csv.writer(f)
+                obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+                if self.recorder is not None:
+                    self.recorder.step(obs, gym_action, reward, planning_time, terminated, truncated)
+                yield StepRecord(obs, gym_action, reward, planning_time, replanned)
 
-        # Header matching your HTN CSV format
-        writer.writerow(['Strategy', 'Episode', 'Success', 'Steps', 'Plans', 
-                         'Reward', 'Planning_Time', 'Fidelity'])
+                total_reward += reward
+                steps += 1
+                actions_executed += 1
+                done = terminated or truncated
 
-        # Write Lazy-Lookahead results
-        
-        for i, r in enumerate(lazy_results):
-            success, steps, plans, reward, plan_time, fidelity = r
-            writer.writerow(['Classical-Run-Lazy-Lookahead', i + 1, success, steps, plans, reward, plan_time, fidelity])
+            success = terminated and reward > 0
 
-        # Write Lookahead results
-        
-        for i, r in enumerate(lookahead_results):
-            success, steps, plans, reward, plan_time, fidelity = r
-            writer.writerow(['Classical-Run-Lookahead', i + 1, success, steps, plans, reward, plan_time, fidelity])
+            if verbose and self.heuristic_cache is not None:
+                print(f"Heuristic cache: {self.heuristic_cache}")
 
-    print(f"Results exported to {filename}")
+            fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
 
+            return success, steps, plan_count, total_reward, total_planning_time, fidelity
+        finally:
+            self.env.close()
+            if self.recorder is not None:
+                self.recorder.end_episode()
 
 
 if __name__ == "__main__":
@@ -374,51 +469,50 @@ if __name__ == "__main__":
     success, steps, plans, reward = planner.run_episode_visual(seed=42, verbose=True, delay=0.3)
 
     print("Classical Planning - RUN-LAZY-LOOKAHEAD Evaluation")
-   
 
-    lazy_results = [] 
-    for i in range(10):
-        success, steps, plans, reward, plan_time, fidelity = planner.run_episode(seed=i, verbose=False)
-        lazy_results.append((success, steps, plans, reward, plan_time, fidelity))
-        print(f"Episode {i + 1:2d}: | Steps={steps:3d} | Plans={plans:2d} | Reward={reward:6.1f}")
+    stats = StreamingAggregator()
 
+    # Rows are written as episodes finish; only the running statistics stay in memory
+    with open("classical_results.csv", "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EPISODE_HEADER)
 
-    print("Classical Planning - RUN-LOOKAHEAD Evaluation")
+        for i in range(10):
+            success, steps, plans, reward, plan_time, fidelity = planner.run_episode(seed=i, verbose=False)
+            stats.add('Classical-Run-Lazy-Lookahead', (success, steps, plans, reward, plan_time, fidelity),
+                      planner.plan_latencies)
+            writer.writerow(['Classical-Run-Lazy-Lookahead', i + 1, success, steps, plans, reward, plan_time, fidelity,
+                             planner.plan_latencies.encode(), planner.optimal_cost,
+                             episode_gap(success, steps, planner.optimal_cost)])
+            print(f"Episode {i + 1:2d}: | Steps={steps:3d} | Plans={plans:2d} | Reward={reward:6.1f}")
 
 
-    lookahead_results = [] 
-    for i in range(10):
-        success, steps, plans, reward, plan_time, fidelity = planner.run_episode_lookahead(seed=i, verbose=False)
-        lookahead_results.append((success, steps, plans, reward, plan_time, fidelity))
-        print(f"Episode {i + 1:2d}: | Steps={steps:3d} | Plans={plans:2d} | Reward={reward:6.1f}")
+        print("Classical Planning - RUN-LOOKAHEAD Evaluation")
 
-    
-  
-    print("Comparison Summary")
 
-    # Lazy-Lookahead stats
-    lazy_success_rate = sum(r[0] for r in lazy_results) / len(lazy_results) * 100
-    lazy_avg_steps = sum(r[1] for r in lazy_results) / len(lazy_results)
-    lazy_avg_plans = sum(r[2] for r in lazy_results) / len(lazy_results)
-    lazy_avg_reward = sum(r[3] for r in lazy_results) / len(lazy_results)
-    lazy_avg_plan_time = sum(r[4] for r in lazy_results) / len(lazy_results)
+        for i in range(10):
+            success, steps, plans, reward, plan_time, fidelity = planner.run_episode_lookahead(seed=i, verbose=False)
+            stats.add('Classical-Run-Lookahead', (success, steps, plans, reward, plan_time, fidelity),
+                      planner.plan_latencies)
+            writer.writerow(['Classical-Run-Lookahead', i + 1, success, steps, plans, reward, plan_time, fidelity,
+                             planner.plan_latencies.encode(), planner.optimal_cost,
+                             episode_gap(success, steps, planner.optimal_cost)])
+            cache_hits = f" | HCache={planner.heuristic_cache.hit_rate:.0%}" if planner.heuristic_cache else ""
+            print(f"Episode {i + 1:2d}: | Steps={steps:3d} | Plans={plans:2d} | Reward={reward:6.1f}{cache_hits}")
 
-    # Lookahead stats
-    lookahead_success_rate = sum(r[0] for r in lookahead_results) / len(lookahead_results) * 100
-    lookahead_avg_steps = sum(r[1] for r in lookahead_results) / len(lookahead_results)
-    lookahead_avg_plans = sum(r[2] for r in lookahead_results) / len(lookahead_results)
-    lookahead_avg_reward = sum(r[3] for r in lookahead_results) / len(lookahead_results)
-    lookahead_avg_plan_time = sum(r[4] for r in lookahead_results) / len(lookahead_results)
+    print("Results exported to classical_results.csv")
 
-    
+    print("Comparison Summary")
+
+    lazy = stats['Classical-Run-Lazy-Lookahead']
+    lookahead = stats['Classical-Run-Lookahead']
 
     # Print comparison table
     print(f"{'Metric':<20} {'Run-Lazy-Lookahead':<25} {'Run-Lookahead':<25}")
-    print(f"{'Success Rate':<20} {lazy_success_rate:>6.1f}%{'':<18} {lookahead_success_rate:>6.1f}%")
-    print(f"{'Avg Steps':<20} {lazy_avg_steps:>6.2f}{'':<19} {lookahead_avg_steps:>6.2f}")
-    print(f"{'Avg Plans':<20} {lazy_avg_plans:>6.2f}{'':<19} {lookahead_avg_plans:>6.2f}")
-    print(f"{'Avg Reward':<20} {lazy_avg_reward:>6.2f}{'':<19} {lookahead_avg_reward:>6.2f}")
-    print(f"{'Avg Planning Time':<20} {lazy_avg_plan_time:>6.3f}s{'':<18} {lookahead_avg_plan_time:>6.3f}s")
-
-    # Export
-    export_both_to_csv(lazy_results, lookahead_results, "classical_results.csv")
+    print(f"{'Success Rate':<20} {lazy.mean('Success') * 100:>6.1f}%{'':<18} {lookahead.mean('Success') * 100:>6.1f}%")
+    print(f"{'Avg Steps':<20} {lazy.mean('Steps'):>6.2f}{'':<19} {lookahead.mean('Steps'):>6.2f}")
+    print(f"{'Avg Plans':<20} {lazy.mean('Plans'):>6.2f}{'':<19} {lookahead.mean('Plans'):>6.2f}")
+    print(f"{'Avg Reward':<20} {lazy.mean('Reward'):>6.2f}{'':<19} {lookahead.mean('Reward'):>6.2f}")
+    print(f"{'Avg Planning Time':<20} {lazy.mean('Planning_Time'):>6.3f}s{'':<18} {lookahead.mean('Planning_Time'):>6.3f}s")
+
+    print(stats.summary())
@@ -0,0 +1,269 @@
+import sys
+import time
+from collections import namedtuple
+
+import gtpyhop
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+from taxi_grid_env import TaxiLayout, random_walls
+from taxi_map import get_map, NORTH, SOUTH, EAST, WEST
+
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+Assignment = namedtuple('Assignment', ['taxi', 'passenger', 'cost', 'plan'])
+
+
+def distance_rows(taxi_map, sources, chunk=256, out=None):
+    """Wall-aware distances from each source cell to every cell, as (len(sources), cells) int32.
+
+    A breadth-first search run for a whole batch of sources at once: each
+    step shifts the frontier of every source one cell in each open direction
+    with array operations over the move bitmasks.
+    """
+    moves = taxi_map.moves
+    rows, cols = moves.shape
+    open_n = (moves[1:, :] & NORTH) != 0
+    open_s = (moves[:-1, :] & SOUTH) != 0
+    open_e = (moves[:, :-1] & EAST) != 0
+    open_w = (moves[:, 1:] & WEST) != 0
+
+    sources = np.asarray(sources, dtype=np.int64).reshape(-1)
+    if out is None:
+        out = np.empty((len(sources), rows * cols), dtype=np.int32)
+    for lo in range(0, len(sources), chunk):
+        batch = sources[lo:lo + chunk]
+        dist = np.full((len(batch), rows, cols), UNREACHABLE, dtype=np.int32)
+        frontier = np.zeros((len(batch), rows, cols), dtype=bool)
+        frontier[np.arange(len(batch)), batch // cols, batch % cols] = True
+        dist[frontier] = 0
+
+        d = 0
+        while frontier.any():
+            d += 1
+            reached = np.zeros_like(frontier)
+            reached[:, :-1, :] |= frontier[:, 1:, :] & open_n
+            reached[:, 1:, :] |= frontier[:, :-1, :] & open_s
+            reached[:, :, 1:] |= frontier[:, :, :-1] & open_e
+            reached[:, :, :-1] |= frontier[:, :, 1:] & open_w
+            reached &= dist == UNREACHABLE
+            dist[reached] = d
+            frontier = reached
+        out[lo:lo + len(batch)] = dist.reshape(len(batch), -1)
+    return out
+
+
+def cost_matrix(layout, taxis, pickups):
+    """taxis x passengers approach distances, gathered in one indexing step.
+
+    Only the distinct pickup cells get distance rows (passengers x cells),
+    never a cells x cells table, which would not fit in memory on large
+    maps. Walls block both directions, so the distance from a pickup to a
+    taxi is the taxi's approach distance.
+    """
+    cols = layout.num_columns
+    taxi_cells = np.asarray(taxis).reshape(-1, 2) @ (cols, 1)
+    pickup_cells = np.asarray(pickups).reshape(-1, 2) @ (cols, 1)
+    sources, pickup_rows = np.unique(pickup_cells, return_inverse=True)
+    dist = distance_rows(get_map(layout), sources)
+    return dist[np.ix_(pickup_rows.reshape(-1), taxi_cells)].T.astype(np.int64)
+
+
+def _square(cost):
+    """Pad a rows <= columns cost matrix with zero-cost dummy rows; the optimum is unchanged."""
+    n, m = cost.shape
+    if n < m:
+        cost = np.vstack([cost, np.zeros((m - n, m), dtype=cost.dtype)])
+    return cost
+
+
+def shortest_augmenting_path(cost):
+    """Min-cost assignment of rows to columns (rows <= columns), Jonker-Volgenant style.
+
+    Column reduction plus a greedy pass over tight edges assign most rows;
+    each remaining row is added by a Dijkstra search over reduced costs.
+    Every column with the current minimum distance is scanned in one array
+    step, which suits the many ties of integer distance costs. Returns the
+    column of each row.
+    """
+    n = cost.shape[0]
+    cost = _square(cost).astype(np.float64)
+    size = cost.shape[0]
+    v = cost.min(axis=0)
+    x = np.full(size, -1)
+    y = np.full(size, -1)
+
+    for j, i in enumerate(cost.argmin(axis=0).tolist()):
+        if x[i] < 0:
+            x[i] = j
+            y[j] = i
+    free_rows = np.flatnonzero(x < 0)
+    reduced = cost[free_rows] - v
+    tight = reduced == reduced.min(axis=1)[:, None]
+    for i, row in zip(free_rows.tolist(), tight):
+        cols = np.flatnonzero(row & (y < 0))
+        if len(cols):
+            x[i] = cols[0]
+            y[cols[0]] = i
+
+    every = np.arange(size)
+    for f in np.flatnonzero(x < 0).tolist():
+        d = cost[f] - v
+        pred = np.full(size, f)
+        scanned = np.zeros(size, dtype=bool)
+        while True:
+            todo = np.where(scanned, np.inf, d)
+            mu = todo.min()
+            cols = np.flatnonzero(todo == mu)
+            free = cols[y[cols] < 0]
+            if len(free):
+                j = int(free[0])
+                break
+            scanned[cols] = True
+            rows = y[cols]
+            candidates = (cost[rows] - v) + (mu - (cost[rows, cols] - v[cols]))[:, None]
+            best = candidates.argmin(axis=0)
+            shorter = candidates[best, every]
+            better = (shorter < d) & ~scanned
+            d[better] = shorter[better]
+            pred[better] = rows[best[better]]
+
+        v[scanned] += d[scanned] - mu
+        while True:
+            i = pred[j]
+            y[j] = i
+            x[i], j = j, x[i]
+            if i == f:
+                break
+    return x[:n]
+
+
+def auction(cost, eps_factor=6.0):
+    """Min-cost assignment of rows to columns (rows <= columns) by a Jacobi auction.
+
+    All unassigned rows bid at once with NumPy; epsilon is scaled down until
+    it drops below 1/n, at which point the result is optimal for integer costs.
+    Returns the column of each row.
+    """
+    n = cost.shape[0]
+    cost = _square(cost)
+    size = cost.shape[0]
+    value = -cost.astype(np.float64)
+    prices = np.zeros(size)
+    eps = max(float(value.max() - value.min()), 1.0) / 2
+    final_eps = 1.0 / (size + 1)
+    rows = np.arange(size)
+
+    while True:
+        eps = max(eps / eps_factor, final_eps)
+        owner = np.full(size, -1)
+        assigned = np.full(size, -1)
+        unassigned = rows
+
+        while len(unassigned):
+            net = value[unassigned] - prices
+            best = net.argmax(axis=1)
+            best_value = net[np.arange(len(unassigned)), best]
+            net[np.arange(len(unassigned)), best] = -np.inf
+            second = net.max(axis=1) if size > 1 else best_value
+            bids = prices[best] + best_value - second + eps
+
+            # Highest bid per column wins
+            order = np.lexsort((-bids, best))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = best[order][1:] != best[order][:-1]
+            winners, columns = unassigned[order[first]], best[order[first]]
+
+            outbid = owner[columns]
+            assigned[outbid[outbid >= 0]] = -1
+            owner[columns] = winners
+            assigned[winners] = columns
+            prices[columns] = bids[order[first]]
+            unassigned = np.flatnonzero(assigned < 0)
+
+        if eps <= final_eps:
+            return assigned[:n]
+
+
+SOLVERS = {'sap': shortest_augmenting_path, 'auction': auction}
+
+
+def assign(cost, method='auto'):
+    """(row indices, column indices) of a min-cost assignment of a rectangular cost matrix.
+
+    'hungarian' is scipy's linear_sum_assignment; 'sap' and 'auction' are the
+    NumPy solvers above. 'auto' uses scipy when it is installed and 'sap'
+    otherwise, which beats the auction on the tie-heavy distance matrices.
+    """
+    if method == 'auto':
+        method = 'hungarian' if linear_sum_assignment is not None else 'sap'
+    if method == 'hungarian':
+        if linear_sum_assignment is None:
+            raise ImportError("method='hungarian' needs scipy")
+        return linear_sum_assignment(cost)
+
+    solve = SOLVERS[method]
+    if cost.shape[0] <= cost.shape[1]:
+        return np.arange(cost.shape[0]), solve(cost)
+    taxis = solve(cost.T)
+    order = np.argsort(taxis)
+    return taxis[order], order
+
+
+def dispatch(layout, taxis, passengers, method='auto', plan=False):
+    """Assign taxis to passengers [(pickup, destination), ...] at least total approach distance.
+
+    With plan=True each pair is handed to the taxi_domain HTN as a 'transport'
+    task and the resulting plan is attached; otherwise plan is None.
+    """
+    if not len(taxis) or not len(passengers):
+        return []
+    cost = cost_matrix(layout, taxis, [pickup for pickup, _ in passengers])
+    rows, cols = assign(cost, method)
+
+    if plan:
+        import taxi_domain
+        taxi_domain.initialize_domain()
+        taxi_map = get_map(layout)
+
+    assignments = []
+    for t, p in zip(rows.tolist(), cols.tolist()):
+        steps = None
+        if plan:
+            pickup, destination = passengers[p]
+            state = taxi_domain.make_state(tuple(taxis[t]), tuple(pickup), tuple(destination),
+                                           taxi_map=taxi_map)
+            steps = gtpyhop.find_plan(state, [('transport',)])
+        assignments.append(Assignment(t, p, int(cost[t, p]), steps))
+    return assignments
+
+
+def benchmark(size=32, counts=(10, 100, 1000), seed=0):
+    """Dispatch time (cost matrix + assignment) as taxis x passengers grows on a size x size map."""
+    walls = random_walls(size, size, seed=seed)
+    layout = TaxiLayout(size, size, (), frozenset(w for a, b in walls for w in ((a, b), (b, a))))
+
+    rng = np.random.default_rng(seed)
+    methods = ['sap', 'auction'] + (['hungarian'] if linear_sum_assignment is not None else [])
+    print(f"{'Taxis':>6} {'Pass.':>6} {'Method':<10} {'Matrix ms':>10} {'Assign ms':>10} {'Cost':>8}")
+    for n in counts:
+        taxis = rng.integers(size, size=(n, 2))
+        pickups = rng.integers(size, size=(n, 2))
+        for method in methods:
+            start = time.perf_counter()
+            cost = cost_matrix(layout, taxis, pickups)
+            matrix_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            rows, cols = assign(cost, method)
+            assign_ms = (time.perf_counter() - start) * 1000
+            print(f"{n:>6} {n:>6} {method:<10} {matrix_ms:>10.2f} {assign_ms:>10.2f} "
+                  f"{int(cost[rows, cols].sum()):>8}")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 32)
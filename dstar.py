@@ -0,0 +1,223 @@
+import heapq
+import math
+import sys
+import time
+
+from taxi_map import DELTAS, DIRECTIONS, NORTH, SOUTH, EAST, WEST, TaxiMap
+
+
+OPPOSITE = {NORTH: SOUTH, SOUTH: NORTH, EAST: WEST, WEST: EAST}
+
+
+class DynamicTaxiMap(TaxiMap):
+    """A TaxiMap whose roads can be closed and reopened during an episode.
+
+    It starts as a copy of a compiled map and keeps the same interface, so
+    the HTN primitives and make_state take it as taxi_map and see closures at
+    once (states share the map, it is never copied). Every change is logged;
+    find_path() hands the changes since its last call to one D* Lite planner
+    per goal, which repairs its previous search instead of starting over.
+    """
+
+    def __init__(self, taxi_map):
+        self.num_rows = taxi_map.num_rows
+        self.num_columns = taxi_map.num_columns
+        self.moves = taxi_map.moves.copy()
+        self.masks = list(taxi_map.masks)
+        # (cell, cell) road changes, in order
+        self.changes = []
+        self._planners = {}
+
+    def set_road(self, a, b, is_open):
+        """Open or close the road between adjacent cells a and b (both directions)."""
+        bit = DIRECTIONS[(b[0] - a[0], b[1] - a[1])]
+        changed = False
+        for (row, col), direction in ((a, bit), (b, OPPOSITE[bit])):
+            cell = row * self.num_columns + col
+            mask = self.masks[cell] | direction if is_open else self.masks[cell] & ~direction
+            if mask != self.masks[cell]:
+                self.masks[cell] = mask
+                self.moves[row, col] = mask
+                changed = True
+        if changed:
+            self.changes.append((a, b))
+        return changed
+
+    def close(self, a, b):
+        return self.set_road(a, b, False)
+
+    def open(self, a, b):
+        return self.set_road(a, b, True)
+
+    @property
+    def pddl_adjacency(self):
+        # Not cached, the roads change
+        return TaxiMap.pddl_adjacency.func(self)
+
+    def find_path(self, start, goal):
+        planner = self._planners.get(goal)
+        if planner is None:
+            planner = self._planners[goal] = DStarLite(self, start, goal)
+        return planner.find_path(start)
+
+
+class DStarLite:
+    """D* Lite (Koenig & Likhachev, 2002) to one goal on a DynamicTaxiMap.
+
+    The search runs backwards from the goal, so when the taxi moves only the
+    key modifier km changes, and when roads change only the costs around the
+    changed cells are repaired. All moves cost 1; a closed road costs inf.
+    `expanded` counts the cells expanded by the last find_path.
+    """
+
+    def __init__(self, dynamic_map, start, goal):
+        self.map = dynamic_map
+        self.goal = goal
+        self.g = {}
+        self.rhs = {goal: 0}
+        self.km = 0
+        self.last = start
+        # Position in dynamic_map.changes up to which the search is current
+        self.seen = len(dynamic_map.changes)
+        self.queue = [(self._h(goal), 0, goal)]
+        # Current key of every cell in the queue; other heap entries are stale
+        self.queued = {goal: (self._h(goal), 0)}
+        self.expanded = 0
+
+    def _h(self, cell):
+        return abs(cell[0] - self.last[0]) + abs(cell[1] - self.last[1])
+
+    def _key(self, cell):
+        best = min(self.g.get(cell, math.inf), self.rhs.get(cell, math.inf))
+        return best + self._h(cell) + self.km, best
+
+    def _neighbors(self, cell):
+        """Cells reachable from cell by an open road; roads are two-way, so also its predecessors."""
+        mask = self.map.masks[cell[0] * self.map.num_columns + cell[1]]
+        for bit in (NORTH, SOUTH, EAST, WEST):
+            if mask & bit:
+                d_row, d_col = DELTAS[bit]
+                yield cell[0] + d_row, cell[1] + d_col
+
+    def _update(self, cell):
+        if cell != self.goal:
+            self.rhs[cell] = min((1 + self.g.get(s, math.inf) for s in self._neighbors(cell)), default=math.inf)
+        if self.g.get(cell, math.inf) != self.rhs.get(cell, math.inf):
+            key = self._key(cell)
+            self.queued[cell] = key
+            heapq.heappush(self.queue, key + (cell,))
+        else:
+            self.queued.pop(cell, None)
+
+    def _top(self):
+        while self.queue:
+            k1, k2, cell = self.queue[0]
+            if self.queued.get(cell) == (k1, k2):
+                return (k1, k2), cell
+            heapq.heappop(self.queue)
+        return (math.inf, math.inf), None
+
+    def _compute(self, start):
+        g, rhs = self.g, self.rhs
+        while True:
+            key, cell = self._top()
+            if cell is None or (key >= self._key(start) and g.get(start, math.inf) == rhs.get(start, math.inf)):
+                return
+            heapq.heappop(self.queue)
+            self.expanded += 1
+            new_key = self._key(cell)
+            if key < new_key:
+                self.queued[cell] = new_key
+                heapq.heappush(self.queue, new_key + (cell,))
+            elif g.get(cell, math.inf) > rhs.get(cell, math.inf):
+                g[cell] = rhs[cell]
+                del self.queued[cell]
+                for pred in self._neighbors(cell):
+                    self._update(pred)
+            else:
+                g[cell] = math.inf
+                self._update(cell)
+                for pred in self._neighbors(cell):
+                    self._update(pred)
+
+    def find_path(self, start):
+        """Shortest path of cells from start to the goal under the current roads, or None."""
+        self.expanded = 0
+        if start != self.last:
+            self.km += abs(start[0] - self.last[0]) + abs(start[1] - self.last[1])
+            self.last = start
+
+        changes = self.map.changes
+        if self.seen < len(changes):
+            for a, b in changes[self.seen:]:
+                # A closure may also cut a neighbour's cheapest road, so both ends are rechecked
+                for cell in (a, b):
+                    self._update(cell)
+            self.seen = len(changes)
+
+        self._compute(start)
+        if self.g.get(start, math.inf) == math.inf:
+            return None
+
+        path = [start]
+        while path[-1] != self.goal:
+            path.append(min(self._neighbors(path[-1]), key=lambda s: self.g.get(s, math.inf)))
+        return path
+
+
+def benchmark(size=100, steps=200, changes_per_step=20, wall_prob=0.2, seed=0):
+    """Repaired D* Lite search vs a full A* replan on every step of a drive under random closures.
+
+    The taxi drives toward a fixed goal one cell per step; before each step,
+    changes_per_step random roads are closed or reopened, a quarter of them
+    next to the current shortest path so that they matter.
+    """
+    import random
+    from hpa import astar_pathfind
+    from taxi_grid_env import random_walls
+
+    rng = random.Random(seed)
+    walls = random_walls(size, size, wall_prob=wall_prob, seed=seed)
+    base = TaxiMap(size, size, frozenset(w for a, b in walls for w in ((a, b), (b, a))))
+    dynamic = DynamicTaxiMap(base)
+
+    start, goal = (0, 0), (size - 1, size - 1)
+    totals = {'full A*': [0.0, 0], 'D* Lite': [0.0, 0]}
+    pos = start
+    path = None
+    moves = 0
+    for _ in range(steps):
+        for i in range(changes_per_step):
+            if path and i < changes_per_step // 4:
+                row, col = rng.choice(path)
+            else:
+                row, col = rng.randrange(size), rng.randrange(size)
+            d_row, d_col = rng.choice(((0, 1), (1, 0)))
+            if row + d_row < size and col + d_col < size:
+                dynamic.set_road((row, col), (row + d_row, col + d_col), rng.random() < 0.5)
+
+        t = time.perf_counter()
+        full, expanded = astar_pathfind(pos, goal, dynamic)
+        totals['full A*'][0] += time.perf_counter() - t
+        totals['full A*'][1] += expanded
+
+        t = time.perf_counter()
+        path = dynamic.find_path(pos, goal)
+        totals['D* Lite'][0] += time.perf_counter() - t
+        totals['D* Lite'][1] += dynamic._planners[goal].expanded
+
+        if (path is None) != (full is None) or (path and len(path) != len(full)):
+            raise AssertionError(f"D* Lite and A* disagree at {pos}")
+        if path is None or len(path) == 1:
+            break
+        pos = path[1]
+        moves += 1
+
+    print(f"{size}x{size}, {changes_per_step} road changes per step, {moves} moves")
+    print(f"{'Search':<8} {'Total ms':>9} {'ms/step':>8} {'Expanded/step':>14}")
+    for name, (seconds, expanded) in totals.items():
+        print(f"{name:<8} {seconds * 1000:>9.0f} {seconds * 1000 / (moves + 1):>8.2f} {expanded / (moves + 1):>14.0f}")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+import gymnasium as gym
+import gtpyhop
+import taxi_grid_env  # registers GridTaxi-v0
+from streaming_stats import LatencyHistogram, RunningStats
+
+
+# Planner name -> (kind, HTN domain or (grounding, backend))
+PLANNERS = {
+    'htn': ('htn', 'objects'),
+    'htn-encoded': ('htn', 'encoded'),
+    'classical': ('classical', ('pyperplan', 'pyperplan')),
+    'classical-bitset': ('classical', ('compact', 'bitset')),
+}
+
+STRATEGIES = ('lookahead', 'lazy')
+
+AgentResult = namedtuple('AgentResult', ['agent', 'strategy', 'success', 'steps', 'decisions',
+                                         'reward', 'latency'])
+
+
+@lru_cache(maxsize=None)
+def _planner(planner, env_id, env_kwargs, thread):
+    """obs -> gym actions, built once per planner / env in each worker process or thread."""
+    kind, variant = PLANNERS[planner]
+    kwargs = json.loads(env_kwargs)
+
+    if kind == 'htn':
+        from htn_acting_strategies import DOMAINS
+        from taxi_domain import action_to_gym, prepare_navigation
+        from taxi_grid_env import get_layout
+        from taxi_map import get_map
+
+        module = DOMAINS[variant]
+        domain = module.initialize_domain()
+        gtpyhop.set_verbose_level(0)
+        env = gym.make(env_id, **kwargs)
+        # Here, in the warm-up, rather than in the first timed request
+        prepare_navigation(get_map(get_layout(env)))
+
+        def plan(obs):
+            gtpyhop.set_current_domain(domain)
+            result = gtpyhop.find_plan(module.decode_gym_obs(env, obs), [('transport',)])
+            return [action_to_gym(a) for a in result] if result else []
+        return plan
+
+    from classical_planning_executor import SimpleTaxiPlanner
+
+    grounding, backend = variant
+    executor = SimpleTaxiPlanner(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taxi_domain.pddl'),
+                                 env_id=env_id, env_kwargs=kwargs, grounding=grounding, backend=backend)
+    executor.start_episode()
+
+    def plan(obs):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.pddl', delete=False) as f:
+            f.write(executor.make_problem(obs))
+        try:
+            result = executor.plan_problem(f.name)
+        finally:
+            os.unlink(f.name)
+        return [executor.pddl_to_gym_action(a.name) for a in result] if result else []
+    return plan
+
+
+def plan_obs(planner, env_id, env_kwargs, obs):
+    """One planning request, run in the pool. env_kwargs is a JSON string so it pickles and hashes."""
+    return _planner(planner, env_id, env_kwargs, threading.get_ident())(obs)
+
+
+def _warm_up(planner, env_id, env_kwargs):
+    _planner(planner, env_id, env_kwargs, threading.get_ident())
+    # Hold the worker briefly so the other warm-up calls land on other workers
+    time.sleep(0.05)
+
+
+async def run_agent(agent, strategy, planner, env_id, env_kwargs, pool, latencies, seed=None,
+                    max_steps=200):
+    """One taxi acting in its own env; every plan is requested from the shared pool.
+
+    Decision latency is measured from submitting the request to having the
+    plan back, so it includes the time spent waiting for a free worker.
+    """
+    loop = asyncio.get_running_loop()
+    env = gym.make(env_id, **json.loads(env_kwargs))
+    obs, _ = env.reset(seed=seed)
+
+    stats = RunningStats()
+    plan = []
+    steps = 0
+    total_reward = 0
+    consecutive_failures = 0
+    terminated = truncated = False
+    reward = 0
+
+    while not (terminated or truncated) and steps < max_steps:
+        if strategy == 'lookahead' or not plan:
+            start = time.perf_counter()
+            plan = await loop.run_in_executor(pool, plan_obs, planner, env_id, env_kwargs, obs)
+            latency = time.perf_counter() - start
+            stats.add(latency)
+            latencies.add(latency)
+            if not plan:
+                break
+
+        old_obs = obs
+        obs, reward, terminated, truncated, _ = env.step(plan.pop(0))
+        total_reward += reward
+        steps += 1
+
+        # Same failure monitor as the lazy loops: replan after two no-op steps
+        if obs == old_obs and not (terminated or truncated):
+            consecutive_failures += 1
+            if consecutive_failures >= 2:
+                plan = []
+                consecutive_failures = 0
+        else:
+            consecutive_failures = 0
+
+        # Let the other agents run between env steps
+        await asyncio.sleep(0)
+
+    env.close()
+    return AgentResult(agent, strategy, terminated and reward > 0, steps, stats.count,
+                       total_reward, stats)
+
+
+async def run_fleet(num_agents, planner='htn-encoded', strategies=STRATEGIES, env_id='Taxi-v3',
+                    env_kwargs=None, workers=None, pool='process', max_steps=200):
+    """Run num_agents taxis concurrently, cycling through strategies.
+
+    Returns (agent results, LatencyHistogram of every decision, wall time).
+    """
+    env_kwargs = json.dumps(env_kwargs or {}, default=sorted, sort_keys=True)
+    executor_cls = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+    workers = workers or os.cpu_count()
+    latencies = LatencyHistogram()
+    loop = asyncio.get_running_loop()
+
+    with executor_cls(max_workers=workers) as executor:
+        # Start every worker and build its planner, so start-up stays out of the latencies
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_up, planner, env_id, env_kwargs)
+                               for _ in range(workers)))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_agent(i, strategies[i % len(strategies)], planner, env_id, env_kwargs, executor,
+                      latencies, seed=i, max_steps=max_steps)
+            for i in range(num_agents)))
+        wall_time = time.perf_counter() - start
+
+    return results, latencies, wall_time
+
+
+def print_report(results, latencies, wall_time, per_agent=False):
+    decisions = sum(r.decisions for r in results)
+    print(f"{len(results)} agents, {decisions} decisions in {wall_time:.2f}s "
+          f"= {decisions / wall_time:.1f} decisions/s, "
+          f"{sum(r.steps for r in results) / wall_time:.1f} steps/s")
+    print("Decision latency: " + ", ".join(f"p{int(q * 100)}={latencies.quantile(q) * 1000:.2f}ms"
+                                           for q in (0.5, 0.95, 0.99)))
+
+    for strategy in sorted({r.strategy for r in results}):
+        group = [r for r in results if r.strategy == strategy]
+        latency = RunningStats()
+        for r in group:
+            latency.merge(r.latency)
+        print(f"{strategy:<10} agents={len(group):4d} success={sum(r.success for r in group) / len(group):6.1%} "
+              f"decisions/agent={sum(r.decisions for r in group) / len(group):6.1f} "
+              f"latency mean={latency.mean * 1000:.2f}ms max={latency.max * 1000:.2f}ms")
+
+    if not per_agent:
+        return
+    print(f"{'Agent':>6} {'Strategy':<10} {'Steps':>5} {'Decisions':>9} {'Mean ms':>8} {'Max ms':>8}")
+    for r in results:
+        print(f"{r.agent:>6} {r.strategy:<10} {r.steps:>5} {r.decisions:>9} "
+              f"{r.latency.mean * 1000:>8.2f} {r.latency.max * 1000:>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate a fleet of taxis sharing a planner pool")
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--planner', choices=sorted(PLANNERS), default='htn-encoded')
+    parser.add_argument('--strategy', choices=STRATEGIES + ('mixed',), default='mixed')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--pool', choices=('process', 'thread'), default='process')
+    parser.add_argument('--env', default='Taxi-v3')
+    parser.add_argument('--max-steps', type=int, default=200)
+    parser.add_argument('--per-agent', action='store_true', help="print every agent's latencies")
+    args = parser.parse_args()
+
+    strategies = STRATEGIES if args.strategy == 'mixed' else (args.strategy,)
+    print_report(*asyncio.run(run_fleet(args.agents, args.planner, strategies, args.env,
+                                        workers=args.workers, pool=args.pool,
+                                        max_steps=args.max_steps)),
+                 per_agent=args.per_agent)
@@ -0,0 +1,238 @@
+import json
+import os
+import queue
+import struct
+import threading
+import zlib
+
+import gymnasium as gym
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+import taxi_grid_env  # registers GridTaxi-v0
+from taxi_grid_env import decode_obs, get_layout
+from taxi_map import EAST, SOUTH, get_map
+
+
+# Colours of the rgb_array frames
+BACKGROUND = (255, 255, 255)
+GRID = (220, 220, 220)
+WALL = (0, 0, 0)
+SITE = (200, 230, 255)
+TAXI = (240, 200, 0)
+TAXI_LOADED = (0, 170, 0)
+PASSENGER = (30, 60, 220)
+DESTINATION = (210, 30, 60)
+
+_DONE = object()
+
+
+def write_png(path, frame):
+    """Write an (h, w, 3) uint8 array as a PNG with zlib alone, so no imaging library is needed."""
+    height, width, _ = frame.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), frame.reshape(height, -1)]).tobytes()
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw, 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+class _Canvas:
+    """Draws frames of one layout: the walls are drawn once, each frame only paints three cells."""
+
+    def __init__(self, env, cell):
+        self.env = env
+        self.cell = cell
+        layout = get_layout(env)
+        moves = get_map(layout).moves
+        rows, cols = moves.shape
+
+        image = np.empty((rows * cell + 1, cols * cell + 1, 3), dtype=np.uint8)
+        image[:] = BACKGROUND
+        image[::cell, :] = GRID
+        image[:, ::cell] = GRID
+        for row, col in layout.locs:
+            image[row * cell + 1:(row + 1) * cell, col * cell + 1:(col + 1) * cell] = SITE
+        image[[0, -1], :] = WALL
+        image[:, [0, -1]] = WALL
+        for row, col in zip(*np.nonzero((moves & EAST) == 0)):
+            image[row * cell:(row + 1) * cell + 1, (col + 1) * cell] = WALL
+        for row, col in zip(*np.nonzero((moves & SOUTH) == 0)):
+            image[(row + 1) * cell, col * cell:(col + 1) * cell + 1] = WALL
+        self.background = image
+
+    def _fill(self, image, pos, colour, margin):
+        row, col = pos
+        c, m = self.cell, margin
+        image[row * c + m:(row + 1) * c - m + 1, col * c + m:(col + 1) * c - m + 1] = colour
+
+    def draw(self, obs):
+        taxi_pos, passenger_loc, destination, in_taxi = decode_obs(self.env, obs)
+        image = self.background.copy()
+        self._fill(image, destination, DESTINATION, max(1, self.cell // 6))
+        self._fill(image, taxi_pos, TAXI_LOADED if in_taxi else TAXI, max(1, self.cell // 4))
+        if passenger_loc is not None:
+            self._fill(image, passenger_loc, PASSENGER, max(1, self.cell // 3))
+        return image
+
+
+class FrameRecorder:
+    """Records episode frames off the acting thread, for visual debugging of headless runs.
+
+    It has the TrajectoryRecorder interface, so any executor takes it as
+    `recorder=`. A step only puts (episode, obs, action) on a bounded queue;
+    when the writer falls behind, frames are dropped and counted rather than
+    making the acting loop wait. A background thread turns each obs into a
+    frame and writes it under out_dir/<strategy>_seed<seed>:
+
+    - mode='rgb_array': frames are drawn from the layout with NumPy (no pygame
+      or display needed, and GridTaxi layouts work too). fmt='png' writes one
+      PNG per frame, fmt='gif' one animated GIF per episode (needs Pillow).
+    - mode='ansi': the env's text rendering, all frames of an episode in one .txt.
+
+    Call close() to drain the queue and finish the last episode. An error in
+    the background thread (a failed render or write) is re-raised by the next
+    flush() or close(); frames queued after it are dropped.
+    """
+
+    def __init__(self, out_dir='frames', mode='rgb_array', fmt='png', max_queued=1024, cell=24, fps=4):
+        if mode not in ('rgb_array', 'ansi'):
+            raise ValueError(f"mode must be 'rgb_array' or 'ansi', not {mode!r}")
+        if mode == 'rgb_array' and fmt == 'gif' and Image is None:
+            raise ImportError("fmt='gif' needs Pillow")
+        self.out_dir = out_dir
+        self.mode = mode
+        self.fmt = fmt
+        self.cell = cell
+        self.fps = fps
+        self.dropped = 0
+        self.written = 0
+        # Episode number -> (tag, env id, env kwargs), set by the acting thread
+        self._episodes = {}
+        self._episode = -1
+        # Whether any frame of the current episode made it onto the queue
+        self._queued = False
+        # First exception of the background thread, re-raised by flush() and close()
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._drain, name='frame-recorder', daemon=True)
+        self._thread.start()
+        os.makedirs(out_dir, exist_ok=True)
+
+    def start_episode(self, strategy, seed, env_id, env_kwargs, obs):
+        self._episode += 1
+        self._episodes[self._episode] = (f"{strategy}_seed{seed}", env_id, env_kwargs or {})
+        self._queued = False
+        self._put(obs, None)
+
+    def step(self, obs, action, reward, latency, terminated, truncated):
+        self._put(obs, action)
+
+    def end_episode(self):
+        # The writer drops an episode's entry when it finishes it; one whose
+        # frames were all dropped never reaches the writer, so drop it here
+        if not self._queued:
+            self._episodes.pop(self._episode, None)
+
+    def _put(self, obs, action):
+        if self._error is not None:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((self._episode, int(obs), action))
+            self._queued = True
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        # Wait for room on the queue only while the background thread can still make it
+        while self._thread.is_alive():
+            try:
+                self._queue.put(_DONE, timeout=1.0)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("frame recorder failed to write frames") from self._error
+
+    def _drain(self):
+        try:
+            self._write_frames()
+        except Exception as error:
+            self._error = error
+            # Keep acknowledging items, so flush() and close() do not wait forever
+            while True:
+                item = self._queue.get()
+                self._queue.task_done()
+                if item is _DONE:
+                    return
+
+    def _write_frames(self):
+        envs = {}
+        episode = None
+        frames = []
+        index = 0
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _DONE:
+                    if episode is not None:
+                        self._finish(episode, frames)
+                    return
+
+                number, obs, action = item
+                if number != episode:
+                    if episode is not None:
+                        self._finish(episode, frames)
+                    episode, frames, index = number, [], 0
+
+                tag, env_id, env_kwargs = self._episodes[number]
+                key = (env_id, json.dumps(env_kwargs, sort_keys=True, default=sorted))
+                if key not in envs:
+                    env = gym.make(env_id, **env_kwargs,
+                                   **({'render_mode': 'ansi'} if self.mode == 'ansi' else {}))
+                    envs[key] = env if self.mode == 'ansi' else _Canvas(env, self.cell)
+
+                if self.mode == 'ansi':
+                    env = envs[key].unwrapped
+                    env.s, env.lastaction = obs, action
+                    frames.append(env.render())
+                elif self.fmt == 'gif':
+                    frames.append(envs[key].draw(obs))
+                else:
+                    directory = os.path.join(self.out_dir, tag)
+                    os.makedirs(directory, exist_ok=True)
+                    write_png(os.path.join(directory, f"frame_{index:05d}.png"), envs[key].draw(obs))
+                index += 1
+                self.written += 1
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, episode, frames):
+        tag = self._episodes.pop(episode)[0]
+        path = os.path.join(self.out_dir, tag)
+        if self.mode == 'ansi':
+            with open(path + '.txt', 'w') as f:
+                for i, text in enumerate(frames):
+                    f.write(f"--- frame {i}\n{text}")
+        elif self.fmt == 'gif' and frames:
+            images = [Image.fromarray(frame) for frame in frames]
+            images[0].save(path + '.gif', save_all=True, append_images=images[1:],
+                           duration=int(1000 / self.fps), loop=0)
@@ -0,0 +1,385 @@
+import heapq
+import sys
+import time
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+import shared_tables
+from taxi_map import EAST, NORTH, SOUTH, WEST, TaxiMap
+
+
+# Maps with at least this many cells navigate over the cluster graph instead of flat BFS
+HPA_MIN_CELLS = 128 * 128
+
+CLUSTER_SIZE = 16
+
+# Border openings up to this long get one transition in the middle, longer ones one at each end
+MAX_SINGLE_ENTRANCE = 5
+
+_START, _GOAL = -1, -2
+
+# Bump when the transitions or in-cluster distances change, so shared tables are rebuilt
+INTRA_TABLE_VERSION = 1
+
+
+class ClusterGraph:
+    """HPA* abstraction of a TaxiMap (Botea, Mueller & Schaeffer, 2004).
+
+    The grid is cut into size x size clusters. Every opening in a cluster
+    border becomes one or two transitions, each a pair of abstract nodes on
+    either side joined by a cost-1 edge; nodes of the same cluster are joined
+    by their shortest distance inside the cluster. A query connects start and
+    goal to their clusters' nodes, searches the small abstract graph with
+    A*, and refines each abstract edge by a BFS confined to one cluster.
+    Paths are near-optimal: detours only come from crossing borders at the
+    chosen transitions. Moves are assumed symmetric, as in every taxi layout.
+
+    rebuild_cluster() updates the graph after walls change inside a cluster
+    without touching the rest of it.
+
+    The in-cluster distances, nearly all of the build time, are computed
+    into one flat table, shared between worker processes on large maps
+    (see shared_tables), and turned into per-cluster dicts on first use.
+    """
+
+    def __init__(self, taxi_map, size=CLUSTER_SIZE):
+        self.taxi_map = taxi_map
+        self.size = size
+        self.cluster_rows = -(-taxi_map.num_rows // size)
+        self.cluster_columns = -(-taxi_map.num_columns // size)
+        # border key -> [(cell, cell), ...] transitions across it
+        self.transitions = {}
+        # cell -> number of transitions it belongs to
+        self.refs = {}
+        # cluster -> set of its node cells
+        self.nodes = {}
+        # cell -> set of node cells across a border
+        self.inter = {}
+        # cluster -> {node: {node: cost}} distances inside the cluster, read from the table on first use
+        self.intra = {}
+        # Cells expanded by the last find_path, abstract and local searches together
+        self.expanded = 0
+
+        for cr in range(self.cluster_rows):
+            for cc in range(self.cluster_columns):
+                self.nodes[cr, cc] = set()
+        for key in self._all_borders():
+            self._build_border(key)
+
+        # cluster -> (offset in the table, sorted nodes); its block holds the nodes x nodes distances
+        self.slots = {}
+        offset = 0
+        for cluster, nodes in self.nodes.items():
+            self.slots[cluster] = (offset, sorted(nodes))
+            offset += len(nodes) ** 2
+        self.table = shared_tables.table(f'hpa-intra-{size}', taxi_map, (offset,), np.int32,
+                                         self._fill_intra, version=INTRA_TABLE_VERSION)
+        self.expanded = 0
+
+    # Construction
+
+    def _all_borders(self):
+        for cr in range(self.cluster_rows):
+            for cc in range(self.cluster_columns):
+                if cc + 1 < self.cluster_columns:
+                    yield ('v', cr, cc)
+                if cr + 1 < self.cluster_rows:
+                    yield ('h', cr, cc)
+
+    def _borders_of(self, cluster):
+        cr, cc = cluster
+        keys = [('v', cr, cc), ('v', cr, cc - 1), ('h', cr, cc), ('h', cr - 1, cc)]
+        return [key for key in keys if key[1] >= 0 and key[2] >= 0
+                and (key[0] != 'v' or key[2] + 1 < self.cluster_columns)
+                and (key[0] != 'h' or key[1] + 1 < self.cluster_rows)]
+
+    def cluster_of(self, cell):
+        return (cell // self.taxi_map.num_columns // self.size,
+                cell % self.taxi_map.num_columns // self.size)
+
+    def _bounds(self, cluster):
+        r0, c0 = cluster[0] * self.size, cluster[1] * self.size
+        return r0, min(r0 + self.size, self.taxi_map.num_rows), c0, min(c0 + self.size, self.taxi_map.num_columns)
+
+    def _runs(self, key):
+        """Openings of a border: runs of adjacent (cell, cell) crossings.
+
+        A run also breaks where a wall runs across the border line on either
+        side, so all crossings of a run are connected along the border and
+        any one of them can stand for the rest.
+        """
+        kind, cr, cc = key
+        masks, cols = self.taxi_map.masks, self.taxi_map.num_columns
+        r0, r1, c0, c1 = self._bounds((cr, cc))
+        if kind == 'v':
+            pairs = [(r * cols + c1 - 1, r * cols + c1) for r in range(r0, r1)]
+            cross, along = EAST, SOUTH
+        else:
+            pairs = [((r1 - 1) * cols + c, r1 * cols + c) for c in range(c0, c1)]
+            cross, along = SOUTH, EAST
+
+        runs = []
+        run = []
+        for a, b in pairs:
+            if run and not (masks[run[-1][0]] & along and masks[run[-1][1]] & along):
+                runs.append(run)
+                run = []
+            if masks[a] & cross:
+                run.append((a, b))
+            elif run:
+                runs.append(run)
+                run = []
+        if run:
+            runs.append(run)
+        return runs
+
+    def _build_border(self, key):
+        chosen = []
+        for run in self._runs(key):
+            if len(run) <= MAX_SINGLE_ENTRANCE:
+                chosen.append(run[len(run) // 2])
+            else:
+                chosen += [run[0], run[-1]]
+
+        self.transitions[key] = chosen
+        for a, b in chosen:
+            for cell, other in ((a, b), (b, a)):
+                self.refs[cell] = self.refs.get(cell, 0) + 1
+                self.nodes[self.cluster_of(cell)].add(cell)
+                self.inter.setdefault(cell, set()).add(other)
+
+    def _drop_border(self, key):
+        for a, b in self.transitions.pop(key, ()):
+            for cell, other in ((a, b), (b, a)):
+                self.inter[cell].discard(other)
+                self.refs[cell] -= 1
+                if self.refs[cell] == 0:
+                    del self.refs[cell]
+                    del self.inter[cell]
+                    self.nodes[self.cluster_of(cell)].discard(cell)
+
+    def _build_intra(self, cluster):
+        nodes = self.nodes[cluster]
+        table = {}
+        for node in nodes:
+            dist, _ = self._local_bfs(node, cluster)
+            table[node] = {other: dist[other] for other in nodes if other != node and other in dist}
+        self.intra[cluster] = table
+
+    def _fill_intra(self, out):
+        """Write every cluster's nodes x nodes distances into its block of out; -1 if unreachable."""
+        for cluster, (offset, nodes) in self.slots.items():
+            block = []
+            for node in nodes:
+                dist, _ = self._local_bfs(node, cluster)
+                block += [dist.get(other, -1) for other in nodes]
+            out[offset:offset + len(block)] = block
+
+    def _intra(self, cluster):
+        table = self.intra.get(cluster)
+        if table is None:
+            offset, nodes = self.slots[cluster]
+            block = self.table[offset:offset + len(nodes) ** 2].tolist()
+            table = {}
+            for i, node in enumerate(nodes):
+                row = block[i * len(nodes):(i + 1) * len(nodes)]
+                table[node] = {other: d for other, d in zip(nodes, row) if other != node and d >= 0}
+            self.intra[cluster] = table
+        return table
+
+    def rebuild_cluster(self, cluster, taxi_map):
+        """Switch to taxi_map, whose walls differ from the old one only inside cluster (row, col).
+
+        The cluster's four borders are re-scanned for transitions, and the
+        in-cluster distances of it and its neighbours (which share those
+        borders' nodes) are recomputed. Nothing else is touched.
+        """
+        self.taxi_map = taxi_map
+        for key in self._borders_of(cluster):
+            self._drop_border(key)
+            self._build_border(key)
+        cr, cc = cluster
+        for neighbour in (cluster, (cr - 1, cc), (cr + 1, cc), (cr, cc - 1), (cr, cc + 1)):
+            if neighbour in self.nodes:
+                self._build_intra(neighbour)
+
+    # Search
+
+    def _local_bfs(self, source, cluster, target=None):
+        """BFS from a cell without leaving its cluster: (distances, parents), stopping at target."""
+        r0, r1, c0, c1 = self._bounds(cluster)
+        masks, cols = self.taxi_map.masks, self.taxi_map.num_columns
+        dist = {source: 0}
+        parent = {source: None}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            self.expanded += 1
+            if cell == target:
+                break
+            row, col = divmod(cell, cols)
+            mask = masks[cell]
+            d = dist[cell] + 1
+            for bit, nxt, inside in ((NORTH, cell - cols, row - 1 >= r0), (SOUTH, cell + cols, row + 1 < r1),
+                                     (EAST, cell + 1, col + 1 < c1), (WEST, cell - 1, col - 1 >= c0)):
+                if mask & bit and inside and nxt not in dist:
+                    dist[nxt] = d
+                    parent[nxt] = cell
+                    queue.append(nxt)
+        return dist, parent
+
+    def _local_path(self, source, target, cluster):
+        _, parent = self._local_bfs(source, cluster, target)
+        if target not in parent:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    def find_path(self, start, goal):
+        """Cells from start to goal (both (row, col)), or None when goal is unreachable."""
+        cols = self.taxi_map.num_columns
+        s, g = start[0] * cols + start[1], goal[0] * cols + goal[1]
+        self.expanded = 0
+        if s == g:
+            return [start]
+
+        start_cluster, goal_cluster = self.cluster_of(s), self.cluster_of(g)
+        start_dist, _ = self._local_bfs(s, start_cluster)
+        goal_dist, _ = self._local_bfs(g, goal_cluster)
+        direct = start_dist.get(g) if start_cluster == goal_cluster else None
+
+        def h(cell):
+            return abs(cell // cols - goal[0]) + abs(cell % cols - goal[1])
+
+        best = {_START: 0}
+        parent = {_START: None}
+        heap = [(h(s), 0, _START)]
+        if direct is not None:
+            best[_GOAL] = direct
+            parent[_GOAL] = _START
+            heapq.heappush(heap, (direct, direct, _GOAL))
+
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == _GOAL:
+                break
+            if cost > best[node]:
+                continue
+            self.expanded += 1
+
+            if node == _START:
+                edges = [(n, start_dist[n]) for n in self.nodes[start_cluster] if n in start_dist]
+            else:
+                cluster = self.cluster_of(node)
+                edges = list(self._intra(cluster)[node].items()) + [(n, 1) for n in self.inter[node]]
+                if cluster == goal_cluster and node in goal_dist:
+                    edges.append((_GOAL, goal_dist[node]))
+
+            for nxt, step in edges:
+                new_cost = cost + step
+                if new_cost < best.get(nxt, new_cost + 1):
+                    best[nxt] = new_cost
+                    parent[nxt] = node
+                    heapq.heappush(heap, (new_cost + (0 if nxt == _GOAL else h(nxt)), new_cost, nxt))
+        else:
+            return None
+
+        abstract = [_GOAL]
+        while abstract[-1] != _START:
+            abstract.append(parent[abstract[-1]])
+        abstract.reverse()
+        cells = [s if n == _START else g if n == _GOAL else n for n in abstract]
+
+        path = [s]
+        for a, b in zip(cells, cells[1:]):
+            if self.cluster_of(a) != self.cluster_of(b):
+                path.append(b)
+            else:
+                path += self._local_path(a, b, self.cluster_of(a))[1:]
+        return [divmod(cell, cols) for cell in path]
+
+
+@lru_cache(maxsize=8)
+def get_cluster_graph(taxi_map, size=CLUSTER_SIZE):
+    """The ClusterGraph of a TaxiMap, built on first use."""
+    return ClusterGraph(taxi_map, size)
+
+
+def astar_pathfind(start, goal, taxi_map):
+    """Flat A* with the Manhattan heuristic, the baseline of benchmark(). Returns (path, expanded)."""
+    cols = taxi_map.num_columns
+    s, g = start[0] * cols + start[1], goal[0] * cols + goal[1]
+    best = {s: 0}
+    parent = {s: None}
+    heap = [(0, 0, s)]
+    expanded = 0
+    while heap:
+        _, cost, cell = heapq.heappop(heap)
+        if cell == g:
+            break
+        if cost > best[cell]:
+            continue
+        expanded += 1
+        for (row, col), _ in taxi_map.neighbors(divmod(cell, cols)):
+            nxt = row * cols + col
+            if cost + 1 < best.get(nxt, cost + 2):
+                best[nxt] = cost + 1
+                parent[nxt] = cell
+                heapq.heappush(heap, (cost + 1 + abs(row - goal[0]) + abs(col - goal[1]), cost + 1, nxt))
+    else:
+        return None, expanded
+
+    path = [g]
+    while path[-1] != s:
+        path.append(parent[path[-1]])
+    return [divmod(cell, cols) for cell in reversed(path)], expanded
+
+
+def benchmark(size=1000, queries=20, wall_prob=0.2, seed=0):
+    """Path length, expanded cells and time of HPA* vs flat A* on a random size x size map."""
+    import numpy as np
+    from taxi_grid_env import random_walls
+
+    start = time.perf_counter()
+    walls = random_walls(size, size, wall_prob=wall_prob, seed=seed)
+    taxi_map = TaxiMap(size, size, frozenset(w for a, b in walls for w in ((a, b), (b, a))))
+    print(f"Map {size}x{size}: {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    graph = ClusterGraph(taxi_map)
+    print(f"Cluster graph ({graph.size}x{graph.size} clusters, "
+          f"{sum(len(n) for n in graph.nodes.values())} nodes): {time.perf_counter() - start:.1f}s (once per map)")
+
+    rng = np.random.default_rng(seed)
+    totals = {'flat': [0, 0, 0.0], 'hpa': [0, 0, 0.0]}
+    solved = 0
+    for _ in range(queries):
+        a, b = tuple(rng.integers(size, size=2).tolist()), tuple(rng.integers(size, size=2).tolist())
+        t = time.perf_counter()
+        flat, expanded = astar_pathfind(a, b, taxi_map)
+        flat_time = time.perf_counter() - t
+        t = time.perf_counter()
+        path = graph.find_path(a, b)
+        hpa_time = time.perf_counter() - t
+        if flat is None or path is None:
+            continue
+        solved += 1
+        for name, p, n, dt in (('flat', flat, expanded, flat_time), ('hpa', path, graph.expanded, hpa_time)):
+            totals[name][0] += len(p) - 1
+            totals[name][1] += n
+            totals[name][2] += dt
+
+    print(f"{solved} connected queries of {queries}")
+    print(f"{'Search':<6} {'Avg length':>11} {'Avg expanded':>13} {'Avg ms':>9}")
+    for name, (length, expanded, seconds) in totals.items():
+        print(f"{name:<6} {length / solved:>11.1f} {expanded / solved:>13.0f} {seconds / solved * 1000:>9.1f}")
+    print(f"HPA* paths are {totals['hpa'][0] / totals['flat'][0] - 1:.2%} longer than optimal")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
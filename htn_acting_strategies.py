@@ -2,166 +2,267 @@
 import gymnasium as gym
 import gtpyhop
 import time
-from taxi_domain import initialize_domain, decode_gym_obs, action_to_gym
+import taxi_domain
+import taxi_domain_int
+from taxi_domain import action_to_gym, prepare_navigation
+from taxi_grid_env import get_layout
+from taxi_map import get_map
+from profiling import profiled
+from step_stream import StepRecord, run_to_end
+from streaming_stats import LatencyHistogram
+from optimality import optimal_cost
+
+
+# State representations the executor can plan over
+DOMAINS = {
+    'objects': taxi_domain,         # gtpyhop.State with named attributes
+    'encoded': taxi_domain_int,     # the gym-encoded int, successor-table primitives
+}
 
 
 class HTNTaxiExecutor:
 
-    def __init__(self):
+    def __init__(self, env_id='Taxi-v3', env_kwargs=None, profiler=None, recorder=None,
+                 domain='objects', validator=None, counters=None, checker=None):
         # Initialize the domain (must be called once before planning)
-        initialize_domain()
+        self.domain_name = domain
+        self.domain_module = DOMAINS[domain]
+        self.domain = self.domain_module.initialize_domain()
         self.env = None
+        # Any Taxi-v3 compatible env, e.g. 'GridTaxi-v0' from taxi_grid_env
+        self.env_id = env_id
+        self.env_kwargs = env_kwargs or {}
+        # Optional profiling.EpisodeProfiler
+        self.profiler = profiler
+        # Optional trajectory_log.TrajectoryRecorder
+        self.recorder = recorder
+        # Optional plan_validator.PlanValidator, checks lazy plans before executing them
+        self.validator = validator
+        # Optional htn_counters.SearchCounters, counts each plan call's search effort
+        self.counters = counters
+        # Latency of each plan call of the current episode
+        self.plan_latencies = LatencyHistogram()
+        # Fewest actions that solve the current episode (optimality.optimal_cost)
+        self.optimal_cost = None
+        # Optional optimality.PlanChecker, compares every plan with the optimal cost
+        self.checker = checker
 
         # Set global verbosity to 0 (silent) for GTPyhop
         gtpyhop.verbose = 0
 
-    def run_lookahead(self, seed=None, verbose=False, max_steps=200):
-        self.env = gym.make('Taxi-v3')
-        obs, _ = self.env.reset(seed=seed)
-
-        done = False
-        total_reward = 0
-        steps = 0
-        plan_count = 0
-        actions_planned = 0
-        actions_executed = 0
-        total_planning_time = 0
+    def make_env(self, **kwargs):
+        # Each episode plans in this executor's domain, whichever was declared last
+        gtpyhop.set_current_domain(self.domain)
+        return gym.make(self.env_id, **{**self.env_kwargs, **kwargs})
 
-        terminated = False
-        truncated = False
-        reward = 0
+    def find_plan(self, state):
+        if self.counters is None:
+            return gtpyhop.find_plan(state, [('transport',)])
+        with self.counters.plan_call(self.domain):
+            return gtpyhop.find_plan(state, [('transport',)])
 
-        # Enable verbose for first episode to debug
-        debug = (seed == 0)
+    @profiled('HTN-Run-Lookahead')
+    def run_lookahead(self, seed=None, verbose=False, max_steps=200):
+        return run_to_end(self.iter_lookahead(seed, verbose, max_steps))
+
+    def iter_lookahead(self, seed=None, verbose=False, max_steps=200):
+        """Run-Lookahead as a generator of step_stream.StepRecords; returns the result tuple."""
+        self.env = self.make_env()
+        self.plan_latencies = LatencyHistogram()
+        try:
+            obs, _ = self.env.reset(seed=seed)
+            self.optimal_cost = optimal_cost(self.env, obs)
+            prepare_navigation(get_map(get_layout(self.env)))
+            if self.recorder is not None:
+                self.recorder.start_episode('HTN-Run-Lookahead', seed, self.env_id, self.env_kwargs, obs)
+            if self.counters is not None:
+                self.counters.start_episode()
+
+            done = False
+            total_reward = 0
+            steps = 0
+            plan_count = 0
+            actions_planned = 0
+            actions_executed = 0
+            total_planning_time = 0
+
+            terminated = False
+            truncated = False
+            reward = 0
+
+            # Enable verbose for first episode to debug
+            debug = (seed == 0)
 
-        if debug:
-            print(f"\n{'=' * 60}")
-            print(f"HTN-RUN-LOOKAHEAD DEBUG - Seed {seed}")
-            print(f"{'=' * 60}")
+            if debug:
+                print(f"\n{'=' * 60}")
+                print(f"HTN-RUN-LOOKAHEAD DEBUG - Seed {seed}")
+                print(f"{'=' * 60}")
 
-        while not done and steps < max_steps:
-            # PLAN
-            state = decode_gym_obs(self.env, obs)
+            while not done and steps < max_steps:
+                # PLAN
+                state = self.domain_module.decode_gym_obs(self.env, obs)
 
-            if debug:
-                taxi_row, taxi_col, pass_idx, dest_idx = self.env.unwrapped.decode(obs)
-                print(f"\n[Step {steps}] Gym State:")
-                print(f"  Raw obs: {obs}")
-                print(f"  Decoded: taxi=({taxi_row},{taxi_col}), pass={pass_idx}, dest={dest_idx}")
-                print(
-                    f"  GTPyhop state: taxi={state.taxi_pos}, pass={state.passenger_loc}, in_taxi={state.passenger_in_taxi}")
-
-            planning_start = time.time()
-            plan = gtpyhop.find_plan(state, [('transport',)])
-            planning_time = time.time() - planning_start
-            total_planning_time += planning_time
-            plan_count += 1
-
-            if not plan:
                 if debug:
-                    print("Planning FAILED!")
-                break
+                    taxi_row, taxi_col, pass_idx, dest_idx = self.env.unwrapped.decode(obs)
+                    print(f"\n[Step {steps}] Gym State:")
+                    print(f"  Raw obs: {obs}")
+                    print(f"  Decoded: taxi=({taxi_row},{taxi_col}), pass={pass_idx}, dest={dest_idx}")
+                    print(
+                        f"  GTPyhop state: taxi={state.taxi_pos}, pass={state.passenger_loc}, in_taxi={state.passenger_in_taxi}")
+
+                planning_start = time.time()
+                plan = self.find_plan(state)
+                planning_time = time.time() - planning_start
+                self.plan_latencies.add(planning_time)
+                total_planning_time += planning_time
+                plan_count += 1
+
+                if not plan:
+                    if debug:
+                        print("Planning FAILED!")
+                    break
 
-            actions_planned += len(plan)
+                actions_planned += len(plan)
+                if self.checker is not None:
+                    self.checker.check(self.env, obs, len(plan), f"HTN-{self.domain_name}")
 
             
 
-            # ACT
-            action = plan[0]
-            gym_action = action_to_gym(action)
+                # ACT
+                action = plan[0]
+                gym_action = action_to_gym(action)
 
             
 
-            old_obs = obs
-            obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+                old_obs = obs
+                obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+                if self.recorder is not None:
+                    self.recorder.step(obs, gym_action, reward, planning_time, terminated, truncated)
+                yield StepRecord(obs, gym_action, reward, planning_time, True)
 
             
-            total_reward += reward
-            steps += 1
-            actions_executed += 1
-            done = terminated or truncated
+                total_reward += reward
+                steps += 1
+                actions_executed += 1
+                done = terminated or truncated
 
-        success = terminated and reward > 0
-        fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
+            success = terminated and reward > 0
+            fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
 
 
-        self.env.close()
-        return success, steps, plan_count, total_reward, total_planning_time, fidelity
+            return success, steps, plan_count, total_reward, total_planning_time, fidelity
+        finally:
+            self.env.close()
+            if self.recorder is not None:
+                self.recorder.end_episode()
 
+    @profiled('HTN-Run-Lazy-Lookahead')
     def run_lazy_lookahead(self, seed=None, verbose=False, max_steps=200):
-        
-        self.env = gym.make('Taxi-v3')
-        obs, _ = self.env.reset(seed=seed)
-
-        done = False
-        total_reward = 0
-        steps = 0
-        plan_count = 0
-        current_plan = []
-        actions_planned = 0
-        actions_executed = 0
-        total_planning_time = 0
-        consecutive_failures = 0
-
-        # Initialize these at the start to avoid UnboundLocalError
-        terminated = False
-        truncated = False
-        reward = 0
+        return run_to_end(self.iter_lazy_lookahead(seed, verbose, max_steps))
+
+    def iter_lazy_lookahead(self, seed=None, verbose=False, max_steps=200):
+        """Run-Lazy-Lookahead as a generator of step_stream.StepRecords; returns the result tuple."""
+        self.env = self.make_env()
+        self.plan_latencies = LatencyHistogram()
+        try:
+            obs, _ = self.env.reset(seed=seed)
+            self.optimal_cost = optimal_cost(self.env, obs)
+            prepare_navigation(get_map(get_layout(self.env)))
+            if self.recorder is not None:
+                self.recorder.start_episode('HTN-Run-Lazy-Lookahead', seed, self.env_id, self.env_kwargs, obs)
+            if self.counters is not None:
+                self.counters.start_episode()
+
+            done = False
+            total_reward = 0
+            steps = 0
+            plan_count = 0
+            current_plan = []
+            actions_planned = 0
+            actions_executed = 0
+            total_planning_time = 0
+            consecutive_failures = 0
+
+            # Initialize these at the start to avoid UnboundLocalError
+            terminated = False
+            truncated = False
+            reward = 0
 
         
-        while not done and steps < max_steps:
-            # PLAN: Only when current plan is exhausted
-            if not current_plan:
-                state = decode_gym_obs(self.env, obs)
-
-                if verbose:
-                    print(f"\n[Step {steps}] ⚙️  REPLANNING from state:")
-                    print(f"  Taxi: {state.taxi_pos}, Passenger: {state.passenger_loc}, "
-                          f"Dest: {state.destination}, In taxi: {state.passenger_in_taxi}")
-
-                planning_start = time.time()
-                plan = gtpyhop.find_plan(state, [('transport',)])
-                planning_time = time.time() - planning_start
-                total_planning_time += planning_time
-                plan_count += 1
-
-                if not plan:
-                    break
-
-                current_plan = list(plan)
-                actions_planned += len(current_plan)
-
-
-            # ACT: Execute next action from current plan
-            action = current_plan.pop(0)
-            gym_action = action_to_gym(action)
+            while not done and steps < max_steps:
+                planning_time = 0.0
+                replanned = not current_plan
+                # PLAN: Only when current plan is exhausted
+                if not current_plan:
+                    state = self.domain_module.decode_gym_obs(self.env, obs)
+
+                    if verbose:
+                        print(f"\n[Step {steps}] ⚙️  REPLANNING from state:")
+                        print(f"  Taxi: {state.taxi_pos}, Passenger: {state.passenger_loc}, "
+                              f"Dest: {state.destination}, In taxi: {state.passenger_in_taxi}")
+
+                    planning_start = time.time()
+                    plan = self.find_plan(state)
+                    planning_time = time.time() - planning_start
+                    self.plan_latencies.add(planning_time)
+                    total_planning_time += planning_time
+                    plan_count += 1
+
+                    if not plan:
+                        break
+
+                    current_plan = list(plan)
+                    actions_planned += len(current_plan)
+                    if self.checker is not None:
+                        self.checker.check(self.env, obs, len(current_plan), f"HTN-{self.domain_name}")
+
+                    if self.validator is not None:
+                        legal = self.validator.valid_prefix(self.env, obs, [action_to_gym(a) for a in current_plan],
+                                                            f"HTN-{self.domain_name}")
+                        # Execute up to the first illegal action, then replan from there. Nothing
+                        # legal means the same state would give the same plan again: give up.
+                        current_plan = current_plan[:legal]
+                        if not current_plan:
+                            break
+
+
+                # ACT: Execute next action from current plan
+                action = current_plan.pop(0)
+                gym_action = action_to_gym(action)
 
         
 
-            old_obs = obs
-            obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+                old_obs = obs
+                obs, reward, terminated, truncated, _ = self.env.step(gym_action)
+                if self.recorder is not None:
+                    self.recorder.step(obs, gym_action, reward, planning_time, terminated, truncated)
+                yield StepRecord(obs, gym_action, reward, planning_time, replanned)
 
-            total_reward += reward
-            steps += 1
-            actions_executed += 1
-            done = terminated or truncated
+                total_reward += reward
+                steps += 1
+                actions_executed += 1
+                done = terminated or truncated
 
-            # MONITOR: Detect action failures (state unchanged)
-            if obs == old_obs and not done:
-                consecutive_failures += 1
+                # MONITOR: Detect action failures (state unchanged)
+                if obs == old_obs and not done:
+                    consecutive_failures += 1
                 
 
-                # Trigger replanning after failure
-                if consecutive_failures >= 2:
-                    current_plan = []
+                    # Trigger replanning after failure
+                    if consecutive_failures >= 2:
+                        current_plan = []
+                        consecutive_failures = 0
+                else:
                     consecutive_failures = 0
-            else:
-                consecutive_failures = 0
 
-        success = terminated and reward > 0
-        fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
+            success = terminated and reward > 0
+            fidelity = actions_executed / actions_planned if actions_planned > 0 else 0
 
         
 
-        self.env.close()
-        return success, steps, plan_count, total_reward, total_planning_time, fidelity
+            return success, steps, plan_count, total_reward, total_planning_time, fidelity
+        finally:
+            self.env.close()
+            if self.recorder is not None:
+                self.recorder.end_episode()
+
@@ -0,0 +1,114 @@
+import functools
+from contextlib import contextmanager
+
+
+# Counts kept for each plan call, in this order (also the extra results columns)
+SEARCH_HEADER = ['Decompositions', 'Method_Failures', 'Actions_Applied',
+                 'Failed_Preconditions', 'Backtracks']
+
+DECOMPOSITIONS, METHOD_FAILURES, ACTIONS_APPLIED, FAILED_PRECONDITIONS, BACKTRACKS = range(len(SEARCH_HEADER))
+
+
+class SearchCounters:
+    """Counts what gtpyhop does inside each find_plan call.
+
+    While a plan call runs, the domain's action and method tables are
+    swapped for copies whose functions count as they go:
+
+    - Decompositions: a method returned subtasks.
+    - Method_Failures: a method was not applicable; for a task whose first
+      method usually fails (m_transport_with_passenger), this is the cost of
+      the method order.
+    - Actions_Applied / Failed_Preconditions: a primitive returned a state / False.
+    - Backtracks: a branch the search had to abandon, either at a failed
+      precondition or at a task none of whose methods applied.
+
+    Nothing is wrapped outside plan_call, so an executor without counters
+    plans exactly as before. `calls` holds the counts of each plan call of
+    the current episode; totals() sums them.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self._counts = None
+        # One [task methods, state, any method applicable] frame per task refinement in progress
+        self._frames = []
+        # id(domain) -> (domain, counting action dict, counting method dict)
+        self._tables = {}
+
+    def start_episode(self):
+        self.calls = []
+
+    def totals(self):
+        return [sum(call[i] for call in self.calls) for i in range(len(SEARCH_HEADER))]
+
+    @contextmanager
+    def plan_call(self, domain):
+        actions, methods = self._counting_tables(domain)
+        saved = domain._action_dict, domain._task_method_dict
+        domain._action_dict, domain._task_method_dict = actions, methods
+        self._counts = [0] * len(SEARCH_HEADER)
+        self._frames = []
+        try:
+            yield
+        finally:
+            domain._action_dict, domain._task_method_dict = saved
+            self.calls.append(tuple(self._counts))
+
+    def _counting_tables(self, domain):
+        cached = self._tables.get(id(domain))
+        if cached is None or cached[0] is not domain:
+            actions = {name: self._count_action(action) for name, action in domain._action_dict.items()}
+            methods = {task: [self._count_method(method, relevant, i == 0, i == len(relevant) - 1)
+                              for i, method in enumerate(relevant)]
+                       for task, relevant in domain._task_method_dict.items()}
+            cached = self._tables[id(domain)] = (domain, actions, methods)
+        return cached[1], cached[2]
+
+    def _count_action(self, action):
+        @functools.wraps(action)
+        def counted(state, *args):
+            new_state = action(state, *args)
+            if new_state is False or new_state is None:
+                self._counts[FAILED_PRECONDITIONS] += 1
+                self._counts[BACKTRACKS] += 1
+            else:
+                self._counts[ACTIONS_APPLIED] += 1
+            return new_state
+        return counted
+
+    def _frame(self, relevant, state, first):
+        """The frame of the refinement of a task with methods relevant from state.
+
+        gtpyhop tries a task's methods in order on the same state object, so
+        the first one starts a new refinement. Nested refinements all run
+        between two of its method calls, so by the next call every frame
+        above its own is finished and is dropped.
+        """
+        frames = self._frames
+        if not first:
+            for i in range(len(frames) - 1, -1, -1):
+                if frames[i][0] is relevant and frames[i][1] is state:
+                    del frames[i + 1:]
+                    return frames[i]
+        frame = [relevant, state, False]
+        frames.append(frame)
+        return frame
+
+    def _count_method(self, method, relevant, first, last):
+        @functools.wraps(method)
+        def counted(state, *args):
+            frame = self._frame(relevant, state, first)
+            subtasks = method(state, *args)
+            if subtasks is False or subtasks is None:
+                self._counts[METHOD_FAILURES] += 1
+                if last and not frame[2]:
+                    self._counts[BACKTRACKS] += 1
+            else:
+                self._counts[DECOMPOSITIONS] += 1
+                frame[2] = True
+            if last:
+                # No method of this task is tried after the last one
+                self._frames.pop()
+            return subtasks
+        return counted
@@ -0,0 +1,124 @@
+import os
+import struct
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from taxi_grid_env import TaxiLayout
+from taxi_map import EAST, WEST, MoveWalls, TaxiMap, compile_moves, get_map, register_map
+
+
+# Binary layout file: this header, then the pickup sites as (num_locs, 2)
+# little-endian uint32 (row, col), then the uint8 move mask of every cell in
+# row-major order (taxi_map.compile_moves). The masks are memory-mapped on
+# load, so opening a map costs the same at any size.
+MAGIC = b'TAXL'
+VERSION = 1
+# magic, version, num_rows, num_columns, num_locs
+HEADER = struct.Struct('<4sIIII')
+
+
+def parse_ascii_map(text):
+    """A TaxiLayout from a gymnasium-style ASCII map of any size.
+
+    The map is framed by '+---+' lines; in each row line cells sit at odd
+    columns and the characters between them are ':' (open) or '|' (wall).
+    A letter or digit in a cell marks a pickup site; sites are numbered in
+    reading order, as in Taxi-v3 (R, G, Y, B). Like the gymnasium format,
+    only walls between columns can be drawn.
+    """
+    lines = text.splitlines() if isinstance(text, str) else list(text)
+    lines = [line.rstrip() for line in lines if line.strip()]
+    if len(lines) < 3 or not lines[0].startswith('+') or lines[0] != lines[-1]:
+        raise ValueError("map must start and end with the same '+---+' border line")
+    width = len(lines[0])
+    if width < 3 or width % 2 == 0:
+        raise ValueError(f"border line has even width {width}")
+    rows = lines[1:-1]
+    for i, line in enumerate(rows, start=2):
+        if len(line) != width or line[0] != '|' or line[-1] != '|':
+            raise ValueError(f"line {i} is not a '|...|' row of width {width}")
+
+    grid = np.frombuffer(''.join(rows).encode('ascii'), dtype=np.uint8).reshape(len(rows), width)
+    separators = grid[:, 2:-1:2]
+    if not np.isin(separators, (ord(':'), ord('|'))).all():
+        raise ValueError("cells must be separated by ':' or '|'")
+
+    num_rows, num_columns = len(rows), (width - 1) // 2
+    moves = compile_moves(num_rows, num_columns, ())
+    wall = separators == ord('|')
+    moves[:, :-1][wall] &= 0xF ^ EAST
+    moves[:, 1:][wall] &= 0xF ^ WEST
+
+    sites = np.nonzero(grid[:, 1::2] != ord(' '))
+    locs = tuple(zip(*(axis.tolist() for axis in sites)))
+    if len(locs) < 2:
+        raise ValueError(f"map needs at least two pickup sites, found {len(locs)}")
+
+    return _register(num_rows, num_columns, locs, moves)
+
+
+def _register(num_rows, num_columns, locs, moves):
+    moves.setflags(write=False)
+    layout = TaxiLayout(num_rows, num_columns, locs, MoveWalls(moves))
+    register_map(layout, TaxiMap.from_moves(moves))
+    return layout
+
+
+def write_layout(path, layout):
+    """Write a TaxiLayout as a binary layout file."""
+    moves = get_map(layout).moves
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, layout.num_rows, layout.num_columns, len(layout.locs)))
+        f.write(np.asarray(layout.locs, dtype='<u4').reshape(-1, 2).tobytes())
+        f.write(np.ascontiguousarray(moves, dtype=np.uint8).tobytes())
+
+
+def load_layout(path):
+    """The TaxiLayout of a binary layout file or an ASCII map file.
+
+    Binary files are recognised by their magic bytes and memory-mapped;
+    anything else is parsed with parse_ascii_map. Either way the compiled
+    map is handed to taxi_map.get_map, so it is not compiled again. Loads
+    are cached until the file changes.
+    """
+    return _load(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _load(path, mtime_ns):
+    with open(path, 'rb') as f:
+        head = f.read(HEADER.size)
+    if not head.startswith(MAGIC):
+        with open(path) as f:
+            return parse_ascii_map(f.read())
+
+    if len(head) < HEADER.size:
+        raise ValueError(f"{path}: truncated header")
+    _, version, num_rows, num_columns, num_locs = HEADER.unpack(head)
+    if version != VERSION:
+        raise ValueError(f"{path}: layout format version {version}, expected {VERSION}")
+    size = HEADER.size + num_locs * 8 + num_rows * num_columns
+    if os.path.getsize(path) != size:
+        raise ValueError(f"{path}: {os.path.getsize(path)} bytes, expected {size}")
+
+    sites = np.memmap(path, dtype='<u4', mode='r', offset=HEADER.size, shape=(num_locs, 2))
+    moves = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size + num_locs * 8,
+                      shape=(num_rows, num_columns))
+    locs = tuple(tuple(loc) for loc in sites.tolist())
+    return _register(num_rows, num_columns, locs, moves)
+
+
+def compile_map(ascii_path, out_path=None):
+    """Compile an ASCII map file into a binary layout file next to it (.taxl)."""
+    out_path = out_path or os.path.splitext(ascii_path)[0] + '.taxl'
+    with open(ascii_path) as f:
+        write_layout(out_path, parse_ascii_map(f.read()))
+    return out_path
+
+
+if __name__ == '__main__':
+    # python layout_file.py maps/*.txt
+    for ascii_path in sys.argv[1:]:
+        print(compile_map(ascii_path))
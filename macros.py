@@ -0,0 +1,197 @@
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from pyperplan.task import Operator
+
+
+# Only runs of these operators are mined; pickups and dropoffs end a run
+MOVE_PREFIX = '(move-'
+
+
+def compose(name, operators):
+    """One grounded operator with the combined effect of applying operators in order.
+
+    A later step's preconditions that an earlier step adds are internal and
+    dropped; the rest become preconditions of the macro. Returns None if a
+    step needs a fact that an earlier step deletes.
+    """
+    pre, add, delete = set(), set(), set()
+    for op in operators:
+        if op.preconditions & (delete - add):
+            return None
+        pre |= op.preconditions - add
+        add = (add - op.del_effects) | op.add_effects
+        delete = (delete - op.add_effects) | op.del_effects
+    return Operator(name, pre, add, delete - add)
+
+
+class MacroLibrary:
+    """Macro-operators mined from the plans of SimpleTaxiPlanner runs.
+
+    Pass it as `macros=` to SimpleTaxiPlanner: the first plan of every
+    episode is recorded (as primitive operator names), and learn() turns the
+    move sequences that recur across plans into grounded macro-operators. From
+    then plan() adds them to each A* task, so A* reaches the goal in fewer,
+    longer steps, and the planner expands them back into primitive actions
+    before executing. The bitset backend plans without them, to stay
+    optimal. Macros are grounded, so a library belongs to one layout.
+    """
+
+    def __init__(self, max_plans=1000):
+        self.max_plans = max_plans
+        self.plans = []
+        # Macro name -> tuple of primitive operator names
+        self.macros = {}
+        # Bumped by every learn(): identifies the current macro set (e.g. in HeuristicCache keys)
+        self.generation = 0
+        # Macro steps found in plans, and the primitive actions they expanded to
+        self.used = 0
+        self.expanded_actions = 0
+
+    def record(self, plan):
+        """Store a plan of primitive operator names for the next learn(); one per episode."""
+        if len(self.plans) < self.max_plans:
+            self.plans.append(tuple(plan))
+
+    def learn(self, min_support=3, max_length=8, max_macros=100):
+        """Replace the macros with the move sequences that save the most search depth.
+
+        The support of a run of 2 to max_length moves is the number of
+        recorded plans that contain it, so a route repeated within one plan
+        still counts once and no single episode can make a macro on its own.
+        Runs with at least min_support (>= 2) are ranked by the steps they
+        save, (length - 1) * support. A run inside an already chosen macro
+        adds nothing and is skipped, which keeps the branching factor from
+        growing with every overlapping subsequence.
+        """
+        if min_support < 2:
+            raise ValueError(f"min_support must be at least 2 (plans), not {min_support}")
+        counts = Counter()
+        for plan in self.plans:
+            runs = set()
+            run = []
+            for name in plan + ('',):
+                if name.startswith(MOVE_PREFIX):
+                    run.append(name)
+                    continue
+                for length in range(2, min(max_length, len(run)) + 1):
+                    for i in range(len(run) - length + 1):
+                        runs.add(tuple(run[i:i + length]))
+                run = []
+            counts.update(runs)
+
+        candidates = sorted((seq for seq, n in counts.items() if n >= min_support),
+                            key=lambda seq: (-(len(seq) - 1) * counts[seq], -len(seq), seq))
+        self.macros = {}
+        self.generation += 1
+        covered = set()
+        for seq in candidates:
+            if len(self.macros) >= max_macros:
+                break
+            if seq in covered:
+                continue
+            self.macros[f"(macro-{len(self.macros)})"] = seq
+            for length in range(2, len(seq) + 1):
+                for i in range(len(seq) - length + 1):
+                    covered.add(seq[i:i + length])
+        return self.macros
+
+    def operators(self, task):
+        """The macros as operators of task; macros with a step the task lacks are left out."""
+        by_name = {op.name: op for op in task.operators}
+        compiled = []
+        for name, seq in self.macros.items():
+            if all(step in by_name for step in seq):
+                op = compose(name, [by_name[step] for step in seq])
+                if op is not None:
+                    compiled.append(op)
+        return compiled
+
+    def expand(self, plan):
+        """Operator names of plan with every macro replaced by its primitive steps."""
+        expanded = []
+        for name in plan:
+            seq = self.macros.get(name)
+            if seq is None:
+                expanded.append(name)
+            else:
+                self.used += 1
+                self.expanded_actions += len(seq)
+                expanded.extend(seq)
+        return expanded
+
+
+def benchmark(size=20, train=30, test=10, wall_prob=0.2, seed=0):
+    """A* expansions, planning time and plan length with and without learned macros.
+
+    Macros are learned from the first plans of `train` episodes on a
+    random size x size GridTaxi map, then both variants plan from the
+    initial states of `test` unseen episodes.
+    """
+    from pyperplan.planner import HEURISTICS, SEARCHES
+    from classical_planning_executor import SimpleTaxiPlanner
+    from pyperplan_wrapper import ground_task
+    from taxi_grid_env import ENV_ID, get_layout, random_walls
+
+    domain_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taxi_domain.pddl')
+    env_kwargs = dict(num_rows=size, num_columns=size,
+                      walls=random_walls(size, size, wall_prob=wall_prob, seed=seed))
+    library = MacroLibrary()
+    planner = SimpleTaxiPlanner(domain_file, env_id=ENV_ID, env_kwargs=env_kwargs,
+                                grounding='compact', macros=library)
+
+    start = time.perf_counter()
+    for episode in range(train):
+        planner.run_episode(seed=episode)
+    library.learn()
+    print(f"{size}x{size}: {len(library.macros)} macros from {len(library.plans)} plans "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    totals = {'primitive': [0, 0.0, 0], 'macros': [0, 0.0, 0]}
+    solved = 0
+    for episode in range(train, train + test):
+        env = planner.start_episode()
+        obs, _ = env.reset(seed=episode)
+        sites = [f"loc-{r}-{c}" for r, c in get_layout(env).locs]
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.pddl', delete=False) as f:
+            f.write(planner.make_problem(obs))
+        env.close()
+
+        try:
+            results = {}
+            for name, macros in (('primitive', None), ('macros', library)):
+                t = time.perf_counter()
+                task = ground_task(domain_file, f.name, 'compact', sites, macros)
+                expansions = 0
+                successors = task.get_successor_states
+
+                def counting(state):
+                    nonlocal expansions
+                    expansions += 1
+                    return successors(state)
+
+                task.get_successor_states = counting
+                solution = SEARCHES['astar'](task, HEURISTICS['hff'](task))
+                results[name] = (solution, expansions, time.perf_counter() - t)
+        finally:
+            os.unlink(f.name)
+
+        if any(solution is None for solution, _, _ in results.values()):
+            continue
+        solved += 1
+        for name, (solution, expansions, seconds) in results.items():
+            totals[name][0] += expansions
+            totals[name][1] += seconds
+            totals[name][2] += len(library.expand([op.name for op in solution]))
+
+    print(f"{solved} solved test problems of {test}")
+    print(f"{'Operators':<10} {'Avg expanded':>13} {'Avg ms':>9} {'Avg actions':>12}")
+    for name, (expansions, seconds, actions) in totals.items():
+        print(f"{name:<10} {expansions / solved:>13.0f} {seconds / solved * 1000:>9.1f} {actions / solved:>12.1f}")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,85 @@
+from functools import lru_cache
+
+import numpy as np
+
+import shared_tables
+from dispatch import UNREACHABLE, distance_rows
+from taxi_grid_env import get_layout
+from taxi_map import get_map
+
+
+@lru_cache(maxsize=8)
+def site_distances(layout):
+    """Wall-aware distance from each pickup site to every cell, as (sites, cells) int32.
+
+    Distances are symmetric, so these rows also give the distance from any
+    taxi cell to a site; one BFS per site covers every state of the layout.
+    Large maps share the rows between worker processes (see shared_tables).
+    """
+    cols = layout.num_columns
+    sources = [row * cols + col for row, col in layout.locs]
+    return shared_tables.table('site-distances', layout, (len(sources), layout.num_rows * cols), np.int32,
+                               lambda out: distance_rows(get_map(layout), sources, out=out))
+
+
+def optimal_cost(env, obs):
+    """Fewest actions that deliver the passenger from obs, or None if it cannot be done.
+
+    Waiting: drive to the passenger, pick up, drive to the destination, drop
+    off. Riding: drive to the destination, drop off. Every action costs one,
+    so this is exact for Taxi-v3 and GridTaxi.
+    """
+    layout = get_layout(env)
+    taxi_row, taxi_col, pass_idx, dest_idx = env.unwrapped.decode(obs)
+    dist = site_distances(layout)
+    cols = layout.num_columns
+    to_dest = int(dist[dest_idx, taxi_row * cols + taxi_col])
+    if to_dest == UNREACHABLE:
+        return None
+    if pass_idx == len(layout.locs):
+        return to_dest + 1
+
+    to_pickup = int(dist[pass_idx, taxi_row * cols + taxi_col])
+    dest_row, dest_col = layout.locs[dest_idx]
+    ride = int(dist[pass_idx, dest_row * cols + dest_col])
+    if to_pickup == UNREACHABLE or ride == UNREACHABLE:
+        return None
+    return to_pickup + ride + 2
+
+
+def episode_gap(success, steps, optimal):
+    """Steps taken beyond the optimum; undefined ('') for failed or unsolvable episodes."""
+    if not success or optimal is None:
+        return ''
+    return steps - optimal
+
+
+class PlanChecker:
+    """Compares the length of every emitted plan with the optimal cost from where it was made.
+
+    Opt-in per executor (`checker=PlanChecker()`), like plan_validator.
+    Counts are kept per planner backend.
+    """
+
+    def __init__(self):
+        # backend -> [plans checked, plans longer than optimal, total excess actions]
+        self.counts = {}
+
+    def check(self, env, obs, plan_length, backend):
+        """Excess actions of a plan made from obs (0 when optimal), or None if obs is unsolvable."""
+        optimal = optimal_cost(env, obs)
+        if optimal is None:
+            return None
+        excess = plan_length - optimal
+        counts = self.counts.setdefault(backend, [0, 0, 0])
+        counts[0] += 1
+        if excess > 0:
+            counts[1] += 1
+            counts[2] += excess
+        return excess
+
+    def report(self):
+        print(f"{'Backend':<30} {'Plans':>7} {'Suboptimal':>11} {'Rate':>7} {'Excess':>7}")
+        for backend, (checked, longer, excess) in sorted(self.counts.items()):
+            rate = longer / checked if checked else 0.0
+            print(f"{backend:<30} {checked:>7} {longer:>11} {rate:>7.1%} {excess:>7}")
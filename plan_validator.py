@@ -0,0 +1,46 @@
+from taxi_domain_int import get_tables
+from taxi_grid_env import get_layout
+
+
+class PlanValidator:
+    """Simulates a plan on the encoded state before any of it is executed.
+
+    Each gym action is looked up in the layout's successor table (see
+    taxi_domain_int), which has no entry for a move into a wall, a pickup
+    away from the passenger or a dropoff away from the destination. The
+    acting loops keep only the legal prefix of a plan and replan when it
+    runs out, instead of discovering the bad action through repeated no-op
+    steps. Counts are kept per planner backend.
+    """
+
+    def __init__(self):
+        # backend -> [plans checked, plans truncated, actions dropped]
+        self.counts = {}
+
+    def valid_prefix(self, env, obs, actions, backend):
+        """Number of leading gym actions of a plan that are legal from obs."""
+        next_state = get_tables(get_layout(env)).next_state
+        state = int(obs)
+        legal = len(actions)
+        for i, action in enumerate(actions):
+            nxt = next_state(state, action)
+            if nxt < 0:
+                legal = i
+                break
+            state = nxt
+
+        counts = self.counts.setdefault(backend, [0, 0, 0])
+        counts[0] += 1
+        if legal < len(actions):
+            counts[1] += 1
+            counts[2] += len(actions) - legal
+        return legal
+
+    def rejection_rate(self, backend):
+        checked, rejected, _ = self.counts.get(backend, (0, 0, 0))
+        return rejected / checked if checked else 0.0
+
+    def report(self):
+        print(f"{'Backend':<30} {'Plans':>7} {'Rejected':>9} {'Rate':>7} {'Dropped':>8}")
+        for backend, (checked, rejected, dropped) in sorted(self.counts.items()):
+            print(f"{backend:<30} {checked:>7} {rejected:>9} {self.rejection_rate(backend):>7.1%} {dropped:>8}")
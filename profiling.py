@@ -0,0 +1,132 @@
+import cProfile
+import functools
+import os
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+
+
+def _frame_label(func):
+    filename, lineno, name = func
+    return f"{os.path.basename(filename)}:{name}:{lineno}".replace(';', ',')
+
+
+def write_collapsed(stats, path, max_depth=64):
+    """Write a pstats.Stats call graph as collapsed stacks (flamegraph.pl, speedscope).
+
+    cProfile only records caller/callee edges, so a callee's self time is
+    split over its callers in proportion to the cumulative time each edge
+    carries. Values are in microseconds.
+    """
+    children = {}
+    roots = []
+    for func, (_, _, _, ct, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    lines = {}
+
+    def walk(func, stack, share):
+        _, _, tt, ct, _ = stats.stats[func]
+        self_us = int(tt * share * 1e6)
+        if self_us > 0:
+            key = ';'.join(stack)
+            lines[key] = lines.get(key, 0) + self_us
+        if len(stack) >= max_depth:
+            return
+        for child, edge_ct in children.get(func, ()):
+            child_ct = stats.stats[child][3]
+            if child_ct <= 0 or _frame_label(child) in stack:
+                continue
+            walk(child, stack + [_frame_label(child)], share * edge_ct / child_ct)
+
+    for root in roots:
+        walk(root, [_frame_label(root)], 1.0)
+
+    with open(path, 'w') as f:
+        for stack, value in sorted(lines.items()):
+            f.write(f"{stack} {value}\n")
+
+
+class EpisodeProfiler:
+    """Opt-in cProfile / tracemalloc capture for every Nth episode of each strategy.
+
+    Each sampled episode writes, under out_dir, files tagged by strategy and seed:
+    <tag>.pstats, <tag>.collapsed (flamegraph input), and with memory=True
+    <tag>.tracemalloc (a tracemalloc.Snapshot dump) plus <tag>.alloc.txt (top allocation sites).
+    """
+
+    def __init__(self, out_dir='profiles', every=1, cpu=True, memory=True, top=25):
+        self.out_dir = out_dir
+        self.every = max(1, every)
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        # Episodes seen per strategy; the first and every Nth after it are profiled
+        self.episodes = {}
+        os.makedirs(out_dir, exist_ok=True)
+
+    @contextmanager
+    def episode(self, strategy, seed):
+        count = self.episodes.get(strategy, 0)
+        self.episodes[strategy] = count + 1
+        if count % self.every != 0:
+            yield
+            return
+
+        tag = os.path.join(self.out_dir, f"{strategy}_seed{seed}")
+        started_tracing = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        profile = cProfile.Profile() if self.cpu else None
+
+        try:
+            if profile is not None:
+                profile.enable()
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+
+            # Snapshot before writing any output so the writers' own allocations stay out of it
+            if self.memory:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                snapshot.dump(tag + '.tracemalloc')
+                self._write_allocations(snapshot, peak, tag + '.alloc.txt')
+
+            if profile is not None:
+                stats = pstats.Stats(profile)
+                stats.dump_stats(tag + '.pstats')
+                write_collapsed(stats, tag + '.collapsed')
+
+    def _write_allocations(self, snapshot, peak, path):
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        with open(path, 'w') as f:
+            f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                f.write(f"{stat}\n")
+
+
+def profiled(strategy):
+    """Run the decorated episode method under self.profiler when one is set."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profiler is None:
+                return method(self, *args, **kwargs)
+            seed = kwargs.get('seed', args[0] if args else None)
+            with self.profiler.episode(strategy, seed):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -6,18 +6,94 @@
 #     return plan
 
 
+from collections import OrderedDict
+
 from pyperplan.planner import _parse, _ground, SEARCHES, HEURISTICS
+from taxi_grounding import ground_compact
+from bitset_search import bitset_bfs
+
+
+class HeuristicCache:
+    """Bounded LRU memo of heuristic values keyed by (operator set, goals, state).
+
+    Meant to live across the plan() calls of one episode: Run-Lookahead
+    replans from states the previous search already scored. hFF depends on
+    the operators, so values computed with different learned macros
+    (operators=MacroLibrary.generation) are kept apart.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def wrap(self, heuristic, task, operators=None):
+        goals = task.goals
+        values = self._values
+
+        def cached_heuristic(node):
+            key = (operators, goals, node.state)
+            h = values.get(key)
+            if h is not None:
+                values.move_to_end(key)
+                self.hits += 1
+                return h
+
+            self.misses += 1
+            h = heuristic(node)
+            values[key] = h
+            if len(values) > self.maxsize:
+                values.popitem(last=False)
+                self.evictions += 1
+            return h
 
+        return cached_heuristic
 
-def plan(domain_file, problem_file):
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __str__(self):
+        return (f"hits={self.hits} misses={self.misses} evictions={self.evictions} "
+                f"size={len(self)} hit_rate={self.hit_rate:.2%}")
+
+
+def ground_task(domain_file, problem_file, grounding='pyperplan', sites=None, macros=None):
     problem = _parse(domain_file, problem_file)
 
-    task = _ground(problem)
+    # 'compact' only instantiates real adjacencies and pickup/destination sites
+    if grounding == 'compact':
+        task = ground_compact(problem, sites)
+    else:
+        task = _ground(problem)
+
+    # Learned macro-operators (macros.MacroLibrary) join the primitive ones
+    if macros is not None:
+        task.operators.extend(macros.operators(task))
+    return task
+
+
+def plan(domain_file, problem_file, grounding='pyperplan', sites=None, backend='pyperplan',
+         heuristic_cache=None, macros=None):
+    # 'bitset' searches int-encoded states breadth-first; plans are optimal. Macros would make
+    # it optimal in operators rather than env actions, so that backend plans without them
+    if backend == 'bitset':
+        return bitset_bfs(ground_task(domain_file, problem_file, grounding, sites))
+
+    task = ground_task(domain_file, problem_file, grounding, sites, macros)
 
     search_func = SEARCHES['astar']
     heuristic_class = HEURISTICS['hff']
 
     heuristic = heuristic_class(task)
+    if heuristic_cache is not None:
+        heuristic = heuristic_cache.wrap(heuristic, task, None if macros is None else macros.generation)
 
     solution = search_func(task, heuristic)
 
@@ -0,0 +1,71 @@
+import hashlib
+import math
+import os
+import tempfile
+
+import numpy as np
+
+from taxi_map import TaxiMap, get_map
+
+
+# Tables at least this large live in memory-mapped files instead of process memory
+SHARE_MIN_BYTES = 1 << 20
+
+TABLE_DIR = os.environ.get('TAXI_TABLE_DIR', 'tables')
+
+
+def layout_key(layout):
+    """Stable hash of a taxi_grid_env.TaxiLayout, the same in every process and host.
+
+    The walls enter through the layout's compiled move masks, one pass over
+    num_rows * num_columns bytes instead of sorting every wall tuple. A
+    taxi_map.TaxiMap is keyed by its walls alone.
+    """
+    if isinstance(layout, TaxiMap):
+        head, taxi_map = (layout.num_rows, layout.num_columns), layout
+    else:
+        head, taxi_map = (layout.num_rows, layout.num_columns, tuple(layout.locs)), get_map(layout)
+    digest = hashlib.sha256(repr(head).encode('utf-8'))
+    digest.update(np.ascontiguousarray(taxi_map.moves, dtype=np.uint8))
+    return digest.hexdigest()[:16]
+
+
+def table(name, layout, shape, dtype, build, version=1, table_dir=None):
+    """A read-only precomputed array for a layout, shared between processes when large.
+
+    layout is a taxi_grid_env.TaxiLayout, or a taxi_map.TaxiMap for tables
+    that do not depend on the pickup sites. build(out) fills a writable
+    array of the given shape and dtype. Small tables are built in process
+    memory. Large ones are built once straight into
+    <table_dir>/<name>-v<version>-<layout hash>.npy and then opened with
+    mmap_mode='r', so every worker on the host maps the same page-cache
+    pages instead of holding its own copy. Concurrent builders each write a
+    private temporary file and rename it into place; the contents are
+    identical, so whichever rename lands last is as good as the first.
+    Bump version whenever build() changes what it writes: files persist
+    across runs, and an old one would otherwise be reused.
+    """
+    dtype = np.dtype(dtype)
+    if math.prod(shape) * dtype.itemsize < SHARE_MIN_BYTES:
+        out = np.empty(shape, dtype=dtype)
+        build(out)
+        out.setflags(write=False)
+        return out
+
+    table_dir = table_dir or TABLE_DIR
+    path = os.path.join(table_dir, f"{name}-v{version}-{layout_key(layout)}.npy")
+    if not os.path.exists(path):
+        os.makedirs(table_dir, exist_ok=True)
+        # Private to this builder, also against other threads of the same process
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.', dir=table_dir)
+        os.close(fd)
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+        build(out)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+
+    shared = np.load(path, mmap_mode='r')
+    if shared.shape != tuple(shape) or shared.dtype != dtype:
+        raise ValueError(f"{path} holds a {shared.dtype}{shared.shape} table, expected {dtype}{tuple(shape)}")
+    return shared
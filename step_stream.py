@@ -0,0 +1,21 @@
+from collections import namedtuple
+
+
+# One environment step of an acting loop. latency is the planning time spent
+# before this action (0.0 when it came from an existing plan); replanned says
+# whether a plan call was made for it.
+StepRecord = namedtuple('StepRecord', ['obs', 'action', 'reward', 'latency', 'replanned'])
+
+
+def run_to_end(steps):
+    """Drain an episode generator and return its result tuple (the generator's return value).
+
+    The acting strategies' iter_* methods yield a StepRecord per step and
+    return (success, steps, plans, reward, planning time, fidelity), so the
+    tuple-returning run_* methods are just this over their generator.
+    """
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
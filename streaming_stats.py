@@ -0,0 +1,259 @@
+import bisect
+import math
+
+
+# Columns of an episode result tuple, as in the results CSVs
+METRICS = ['Success', 'Steps', 'Plans', 'Reward', 'Planning_Time', 'Fidelity']
+
+# Rows of the per-episode results CSVs of both executors: the result tuple plus
+# the episode's histogram of plan call latencies (LatencyHistogram.encode), its
+# optimal cost from the initial state and the steps taken beyond it (see optimality)
+EPISODE_HEADER = ['Strategy', 'Episode'] + METRICS + ['Plan_Latencies', 'Optimal_Cost', 'Gap']
+
+
+class RunningStats:
+    """Online mean / variance (Welford), mergeable across runs."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        x = float(x)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        # Sample variance, matching pandas' default std(ddof=1)
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class LatencyHistogram:
+    """Fixed log-scaled buckets of latencies in seconds.
+
+    Bucket i holds values in [bounds[i-1], bounds[i]); bucket 0 everything
+    below the smallest bound and the last bucket everything above the largest.
+    Histograms with the same bounds merge by adding counts.
+    """
+
+    def __init__(self, low=1e-6, high=100.0, per_decade=4):
+        decades = round(math.log10(high / low))
+        self.bounds = [low * 10 ** (i / per_decade) for i in range(decades * per_decade + 1)]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_right(self.bounds, seconds)] += 1
+        self.total += 1
+
+    def merge(self, other):
+        assert self.bounds == other.bounds, "histograms use different buckets"
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        return self
+
+    def encode(self):
+        """Compact text for a CSV cell: 'bucket:count' for each non-empty bucket."""
+        return ' '.join(f"{i}:{count}" for i, count in enumerate(self.counts) if count)
+
+    @classmethod
+    def decode(cls, text, **buckets):
+        """Inverse of encode(); buckets must match the ones it was encoded with."""
+        hist = cls(**buckets)
+        if isinstance(text, str):
+            for pair in text.split():
+                i, count = map(int, pair.split(':'))
+                hist.counts[i] += count
+                hist.total += count
+        return hist
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        if self.total == 0:
+            return math.nan
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+
+class P2Quantile:
+    """P-square streaming estimate of one quantile (Jain & Chlamtac, 1985)."""
+
+    def __init__(self, q):
+        self.q = q
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        heights = self.heights
+        if len(heights) < 5:
+            bisect.insort(heights, x)
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(heights, x) - 1
+
+        for i in range(k + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - self.positions[i]
+            if (d >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+                    (d <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                d = 1 if d > 0 else -1
+                h = self._parabolic(i, d)
+                if not heights[i - 1] < h < heights[i + 1]:
+                    h = self._linear(i, d)
+                heights[i] = h
+                self.positions[i] += d
+
+    def _parabolic(self, i, d):
+        n, h = self.positions, self.heights
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, d):
+        n, h = self.positions, self.heights
+        return h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+
+    def value(self):
+        if not self.heights:
+            return math.nan
+        if len(self.heights) < 5:
+            idx = min(len(self.heights) - 1, int(self.q * len(self.heights)))
+            return self.heights[idx]
+        return self.heights[2]
+
+
+class StrategyStats:
+    """Constant-memory summary of one strategy's episode results."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.metrics = {name: RunningStats() for name in METRICS}
+        self.planning_time_hist = LatencyHistogram()
+        self.planning_time_quantiles = {q: P2Quantile(q) for q in self.QUANTILES}
+        # Individual plan calls, merged from each episode's histogram
+        self.plan_latency_hist = LatencyHistogram()
+
+    def add(self, result, latencies=None):
+        for name, value in zip(METRICS, result):
+            self.metrics[name].add(value)
+        plan_time = result[METRICS.index('Planning_Time')]
+        self.planning_time_hist.add(plan_time)
+        for sketch in self.planning_time_quantiles.values():
+            sketch.add(plan_time)
+        if latencies is not None:
+            self.plan_latency_hist.merge(latencies)
+
+    @property
+    def episodes(self):
+        return self.metrics['Success'].count
+
+    def mean(self, name):
+        return self.metrics[name].mean
+
+
+class StreamingAggregator:
+    """Per-strategy streaming statistics fed one episode result at a time."""
+
+    def __init__(self):
+        self.strategies = {}
+
+    def add(self, strategy, result, latencies=None):
+        if strategy not in self.strategies:
+            self.strategies[strategy] = StrategyStats()
+        self.strategies[strategy].add(result, latencies)
+
+    def __getitem__(self, strategy):
+        return self.strategies[strategy]
+
+    def summary(self):
+        """Same table as visualization.calculate_summary_stats on the CSV rows."""
+        import pandas as pd
+
+        index = sorted(self.strategies)
+        columns = pd.MultiIndex.from_product([METRICS, ['mean', 'std']])
+        rows = []
+        for strategy in index:
+            row = []
+            for name in METRICS:
+                stats = self.strategies[strategy].metrics[name]
+                row += [stats.mean, stats.std]
+            rows.append(row)
+
+        summary = pd.DataFrame(rows, index=pd.Index(index, name='Strategy'), columns=columns)
+        return summary.round(2)
+
+    def print_comparison(self, first, second):
+        """The running means of two strategies side by side, one metric per line."""
+        a, b = self.strategies[first], self.strategies[second]
+
+        metrics = [
+            ("Success Rate", lambda s: s.mean('Success') * 100, "%"),
+            ("Avg Steps", lambda s: s.mean('Steps'), ""),
+            ("Avg Plans", lambda s: s.mean('Plans'), ""),
+            ("Avg Reward", lambda s: s.mean('Reward'), ""),
+            ("Avg Planning Time", lambda s: s.mean('Planning_Time'), "s"),
+            ("Avg Fidelity", lambda s: s.mean('Fidelity'), ""),
+        ]
+
+        for name, func, unit in metrics:
+            a_val = func(a)
+            b_val = func(b)
+
+            if unit == "%":
+                print(f"{name:<25} {a_val:>6.1f}{unit:<14} {b_val:>6.1f}{unit:<14}")
+            elif unit == "s":
+                print(f"{name:<25} {a_val:>6.3f}{unit:<14} {b_val:>6.3f}{unit:<14}")
+            else:
+                print(f"{name:<25} {a_val:>6.2f}{unit:<14} {b_val:>6.2f}{unit:<14}")
+
+        for label, stats in ((first, a), (second, b)):
+            quantiles = ", ".join(f"p{int(q * 100)}={sketch.value():.4f}s"
+                                  for q, sketch in stats.planning_time_quantiles.items())
+            print(f"{label} planning time per episode: {quantiles}")
+            hist = stats.plan_latency_hist
+            if hist.total:
+                quantiles = ", ".join(f"p{int(q * 100)}<{hist.quantile(q):.4f}s" for q in stats.QUANTILES)
+                print(f"{label} latency per plan call ({hist.total} calls): {quantiles}")
@@ -0,0 +1,217 @@
+import contextlib
+import csv
+import functools
+import glob
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from htn_executor import EPISODE_HEADER, evaluate_strategy
+from streaming_stats import LatencyHistogram, StreamingAggregator
+from taxi_grid_env import ENV_ID, random_walls
+
+
+# Strategy name -> (executor kind, episode method)
+STRATEGIES = {
+    'HTN-Run-Lookahead': ('htn', 'run_lookahead'),
+    'HTN-Run-Lazy-Lookahead': ('htn', 'run_lazy_lookahead'),
+    'Classical-Run-Lookahead': ('classical', 'run_episode_lookahead'),
+    'Classical-Run-Lazy-Lookahead': ('classical', 'run_episode'),
+}
+
+SWEEP_HEADER = EPISODE_HEADER + ['Env', 'Variant']
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_hash(directory=CODE_DIR):
+    """Hash of every module and PDDL file the episodes could depend on."""
+    digest = hashlib.sha256()
+    paths = sorted(glob.glob(os.path.join(directory, '*.py')) +
+                   glob.glob(os.path.join(directory, '*.pddl')))
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def grid_env(grid):
+    """(env id, env kwargs) for a grid entry of the config.
+
+    A string is an env id used as is; a dict describes a GridTaxi map by
+    num_rows, num_columns and optionally wall_prob / wall_seed, so its walls
+    are rebuilt identically in every worker, or names a layout_file (a binary
+    layout or ASCII map, see layout_file) that every worker loads.
+    """
+    if isinstance(grid, str):
+        return grid, {}
+    if 'layout_file' in grid:
+        return ENV_ID, dict(layout_file=grid['layout_file'])
+    walls = random_walls(grid['num_rows'], grid['num_columns'],
+                         grid.get('wall_prob', 0.2), grid.get('wall_seed', 0))
+    return ENV_ID, dict(num_rows=grid['num_rows'], num_columns=grid['num_columns'], walls=walls)
+
+
+def grid_label(grid):
+    if isinstance(grid, str):
+        return grid
+    if 'layout_file' in grid:
+        return os.path.splitext(os.path.basename(grid['layout_file']))[0]
+    return (f"{grid['num_rows']}x{grid['num_columns']}"
+            f"-w{grid.get('wall_prob', 0.2)}-s{grid.get('wall_seed', 0)}")
+
+
+def plan_cells(config):
+    """The cartesian product of the config, in a fixed order.
+
+    Config keys: strategies, grids, seeds ([start, stop)), seeds_per_cell,
+    backends (classical strategies), domains (HTN strategies), grounding and
+    max_steps. Each cell is one strategy / grid / variant over one block of seeds.
+    """
+    start, stop = config['seeds']
+    per_cell = config.get('seeds_per_cell', 10)
+    blocks = [(first, min(per_cell, stop - first)) for first in range(start, stop, per_cell)]
+
+    cells = []
+    for strategy, grid in itertools.product(config['strategies'], config['grids']):
+        kind, _ = STRATEGIES[strategy]
+        variants = config.get('backends', ['pyperplan']) if kind == 'classical' \
+            else config.get('domains', ['objects'])
+        for variant, (first_seed, num_episodes) in itertools.product(variants, blocks):
+            cells.append({
+                'strategy': strategy,
+                'grid': grid,
+                'variant': variant,
+                'grounding': config.get('grounding', 'pyperplan') if kind == 'classical' else None,
+                'first_seed': first_seed,
+                'num_episodes': num_episodes,
+                'max_steps': config.get('max_steps', 200),
+            })
+    return cells
+
+
+def cell_key(cell, code):
+    blob = json.dumps({'code': code, **cell}, sort_keys=True)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:20]
+
+
+def make_strategy(cell):
+    """Build the executor of a cell and return its episode method."""
+    kind, method = STRATEGIES[cell['strategy']]
+    env_id, env_kwargs = grid_env(cell['grid'])
+
+    if kind == 'htn':
+        from htn_acting_strategies import HTNTaxiExecutor
+        executor = HTNTaxiExecutor(env_id, env_kwargs, domain=cell['variant'])
+    else:
+        from classical_planning_executor import SimpleTaxiPlanner
+        executor = SimpleTaxiPlanner(os.path.join(CODE_DIR, 'taxi_domain.pddl'), env_id=env_id,
+                                     env_kwargs=env_kwargs, grounding=cell['grounding'],
+                                     backend=cell['variant'])
+    return executor, functools.partial(getattr(executor, method), max_steps=cell['max_steps'])
+
+
+class _CellWriter:
+    """csv.writer stand-in that appends the cell's Env / Variant columns."""
+
+    def __init__(self, writer, cell):
+        self.writer = writer
+        self.extra = [grid_label(cell['grid']), cell['variant']]
+
+    def writerow(self, row):
+        self.writer.writerow(list(row) + self.extra)
+
+
+def run_cell(job):
+    """Run one cell and checkpoint it. Runs in a worker process.
+
+    The CSV is written under a temporary name and renamed when complete, so
+    its existence marks the cell as done; a preempted cell leaves only a
+    .tmp file and is rerun on resume.
+    """
+    cell, key, out_dir = job
+    path = os.path.join(out_dir, 'cells', key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    start = time.perf_counter()
+
+    with open(path + '.json', 'w') as f:
+        json.dump(cell, f, indent=2, sort_keys=True)
+
+    with open(os.path.join(out_dir, 'logs', key + '.log'), 'w') as log, \
+            contextlib.redirect_stdout(log), open(tmp, 'w', newline='') as f:
+        executor, strategy_func = make_strategy(cell)
+        evaluate_strategy(executor, cell['strategy'], strategy_func,
+                          num_episodes=cell['num_episodes'], verbose_first=False,
+                          writer=_CellWriter(csv.writer(f), cell), keep_results=False,
+                          first_seed=cell['first_seed'])
+
+    os.replace(tmp, path + '.csv')
+    return key, time.perf_counter() - start
+
+
+def merge(cells, keys, out_dir, filename='results.csv'):
+    """Concatenate the cell checkpoints in plan order into one CSV."""
+    stats = StreamingAggregator()
+    with open(os.path.join(out_dir, filename), 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(SWEEP_HEADER)
+        for cell, key in zip(cells, keys):
+            with open(os.path.join(out_dir, 'cells', key + '.csv'), newline='') as f:
+                for row in csv.reader(f):
+                    writer.writerow(row)
+                    result = (row[2] == 'True', int(row[3]), int(row[4]),
+                              float(row[5]), float(row[6]), float(row[7]))
+                    stats.add(f"{row[0]} {row[-2]} {row[-1]}", result, LatencyHistogram.decode(row[8]))
+    return stats
+
+
+def _report(done, total):
+    for n, (key, elapsed) in enumerate(done, 1):
+        print(f"[{n}/{total}] cell {key} done in {elapsed:.1f}s")
+
+
+def run_sweep(config, out_dir=None, workers=None):
+    """Run every cell of config that has no checkpoint yet, then merge.
+
+    Cells are keyed by a hash of their settings and of the code, so a rerun
+    after preemption only does the missing cells, and a code change reruns
+    everything. Returns the StreamingAggregator of the merged results.
+    """
+    out_dir = out_dir or config.get('out_dir', 'sweeps')
+    workers = workers or config.get('workers') or os.cpu_count()
+    os.makedirs(os.path.join(out_dir, 'cells'), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, 'logs'), exist_ok=True)
+    for tmp in glob.glob(os.path.join(out_dir, 'cells', '*.tmp')):
+        os.remove(tmp)
+
+    code = code_hash()
+    cells = plan_cells(config)
+    keys = [cell_key(cell, code) for cell in cells]
+    pending = [(cell, key, out_dir) for cell, key in zip(cells, keys)
+               if not os.path.exists(os.path.join(out_dir, 'cells', key + '.csv'))]
+
+    with open(os.path.join(out_dir, 'sweep.json'), 'w') as f:
+        json.dump({'config': config, 'code': code, 'cells': keys}, f, indent=2)
+
+    print(f"{len(cells)} cells, {len(cells) - len(pending)} already done, "
+          f"{len(pending)} to run on {workers} workers")
+
+    if workers == 1:
+        _report(map(run_cell, pending), len(pending))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            _report(pool.imap_unordered(run_cell, pending), len(pending))
+
+    return merge(cells, keys, out_dir)
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1]) as f:
+        config = json.load(f)
+    stats = run_sweep(config)
+    print(stats.summary())
@@ -2,111 +2,55 @@
 import gtpyhop
 import copy
 from collections import deque
+from taxi_grid_env import decode_obs, get_layout, TAXI_V3_LAYOUT
+from taxi_map import get_map, NORTH, SOUTH, EAST, WEST
+from hpa import HPA_MIN_CELLS, get_cluster_graph
+from dstar import DynamicTaxiMap
 
 
 # Create domain object
-gtpyhop.current_domain = gtpyhop.Domain('taxi')
+domain = gtpyhop.Domain('taxi')
+gtpyhop.current_domain = domain
 
 
 
-def make_state(taxi_pos, passenger_loc, destination, passenger_in_taxi=False):
+def make_state(taxi_pos, passenger_loc, destination, passenger_in_taxi=False, taxi_map=None):
     state = gtpyhop.State('taxi_state')
     state.taxi_pos = taxi_pos
     state.passenger_loc = passenger_loc
     state.destination = destination
     state.passenger_in_taxi = passenger_in_taxi
 
-    # Taxi-v3 wall configuration
-    state.walls = {
-        # Top-left vertical wall (between columns 0-1, rows 0-1)
-        ((0, 0), (0, 1)), ((0, 1), (0, 0)),
-        ((1, 0), (1, 1)), ((1, 1), (1, 0)),
-        # Top-right vertical wall (between columns 3-4, rows 0-1)
-        ((0, 3), (0, 4)), ((0, 4), (0, 3)),
-        ((1, 3), (1, 4)), ((1, 4), (1, 3)),
-        # Bottom-left L-shaped wall
-        ((3, 0), (4, 0)), ((4, 0), (3, 0)),  
-        ((3, 0), (3, 1)), ((3, 1), (3, 0)),  
-        ((4, 0), (4, 1)), ((4, 1), (4, 0)),  
-        # Bottom-middle reverse-L shaped wall
-        ((3, 2), (4, 2)), ((4, 2), (3, 2)),  
-        ((3, 2), (3, 3)), ((3, 3), (3, 2)),  
-        ((4, 2), (4, 3)), ((4, 3), (4, 2)),  
-    }
+    # Compiled wall layout, shared with the PDDL pipeline (Taxi-v3 by default)
+    state.taxi_map = taxi_map if taxi_map is not None else get_map(TAXI_V3_LAYOUT)
 
     return state
 
 
-
-
-def move_north(state):
-    
+def _move(state, bit, d_row, d_col):
     row, col = state.taxi_pos
-    new_pos = (row - 1, col)
-
-    
-    if row <= 0:
+    if not state.taxi_map.masks[row * state.taxi_map.num_columns + col] & bit:
         return False
 
-    
-    if (state.taxi_pos, new_pos) in state.walls:
-        return False
-
-    
     new_state = copy.deepcopy(state)
-    new_state.taxi_pos = new_pos
+    new_state.taxi_pos = (row + d_row, col + d_col)
     return new_state
 
 
-def move_south(state):
-    
-    row, col = state.taxi_pos
-    new_pos = (row + 1, col)
-
-    if row >= 4:
-        return False
+def move_north(state):
+    return _move(state, NORTH, -1, 0)
 
-    if (state.taxi_pos, new_pos) in state.walls:
-        return False
 
-    
-    new_state = copy.deepcopy(state)
-    new_state.taxi_pos = new_pos
-    return new_state
+def move_south(state):
+    return _move(state, SOUTH, 1, 0)
 
 
 def move_east(state):
-    
-    row, col = state.taxi_pos
-    new_pos = (row, col + 1)
-
-    if col >= 4:
-        return False
-
-    if (state.taxi_pos, new_pos) in state.walls:
-        return False
-
-    
-    new_state = copy.deepcopy(state)
-    new_state.taxi_pos = new_pos
-    return new_state
+    return _move(state, EAST, 0, 1)
 
 
 def move_west(state):
-    
-    row, col = state.taxi_pos
-    new_pos = (row, col - 1)
-
-    if col <= 0:
-        return False
-
-    if (state.taxi_pos, new_pos) in state.walls:
-        return False
-
-    # Create NEW state
-    new_state = copy.deepcopy(state)
-    new_state.taxi_pos = new_pos
-    return new_state
+    return _move(state, WEST, 0, -1)
 
 
 def pickup_passenger(state):
@@ -143,7 +87,7 @@ def dropoff_passenger(state):
 
 
 
-def bfs_pathfind(start, goal, walls):
+def bfs_pathfind(start, goal, taxi_map):
     if start == goal:
         return [start]
 
@@ -152,25 +96,13 @@ def bfs_pathfind(start, goal, walls):
     visited = {start}
 
     while queue:
-        (row, col), path = queue.popleft()
-
-        
-        for dr, dc in [(-1, 0), (1, 0), (0, 1), (0, -1)]:
-            new_row, new_col = row + dr, col + dc
-            new_pos = (new_row, new_col)
-
-            
-            if not (0 <= new_row <= 4 and 0 <= new_col <= 4):
-                continue
+        pos, path = queue.popleft()
 
+        for new_pos, _ in taxi_map.neighbors(pos):
             # Check if already visited
             if new_pos in visited:
                 continue
 
-            # Check walls
-            if ((row, col), new_pos) in walls:
-                continue
-
             # Found goal
             if new_pos == goal:
                 return path + [new_pos]
@@ -183,6 +115,26 @@ def bfs_pathfind(start, goal, walls):
     return None
 
 
+def find_path(start, goal, taxi_map):
+    """bfs_pathfind on ordinary maps; near-optimal HPA* (see hpa) on maps of HPA_MIN_CELLS or more.
+
+    A DynamicTaxiMap (see dstar) repairs its D* Lite search after road closures instead.
+    """
+    if isinstance(taxi_map, DynamicTaxiMap):
+        return taxi_map.find_path(start, goal)
+    if taxi_map.num_rows * taxi_map.num_columns >= HPA_MIN_CELLS:
+        return get_cluster_graph(taxi_map).find_path(start, goal)
+    return bfs_pathfind(start, goal, taxi_map)
+
+
+def prepare_navigation(taxi_map):
+    """Build what find_path needs for taxi_map ahead of planning.
+
+    On large maps that is the HPA* cluster graph, which otherwise would be
+    built inside the first plan call and counted as its planning time.
+    """
+    if not isinstance(taxi_map, DynamicTaxiMap) and taxi_map.num_rows * taxi_map.num_columns >= HPA_MIN_CELLS:
+        get_cluster_graph(taxi_map)
 
 
 def m_transport_with_passenger(state):
@@ -229,7 +181,7 @@ def m_navigate_to_location(state, target_location):
         return []
 
     
-    path = bfs_pathfind(current, target, state.walls)
+    path = find_path(current, target, state.taxi_map)
 
     if not path:
         # No valid path found
@@ -258,6 +210,8 @@ def m_navigate_to_location(state, target_location):
 
 
 def initialize_domain():
+    # Other domains (e.g. taxi_domain_int) may have been made current since import
+    gtpyhop.set_current_domain(domain)
     gtpyhop.declare_actions(
         move_north, move_south, move_east, move_west,
         pickup_passenger, dropoff_passenger
@@ -273,31 +227,17 @@ def initialize_domain():
                                   m_get_passenger)
     gtpyhop.declare_task_methods('deliver_passenger',
                                   m_deliver_passenger)
+    return domain
 
 
 
 
 def decode_gym_obs(env, obs):
-    
-    LOCATIONS = {'R': (0, 0), 'G': (0, 4), 'Y': (4, 0), 'B': (4, 3)}
-    LOC_NAMES = ['R', 'G', 'Y', 'B']
-
-    taxi_row, taxi_col, pass_idx, dest_idx = env.unwrapped.decode(obs)
-
-    taxi_pos = (taxi_row, taxi_col)
-
-    if pass_idx == 4:  # Passenger in taxi
-        passenger_loc = None
-        passenger_in_taxi = True
-    else:
-        pr, pc = LOCATIONS[LOC_NAMES[pass_idx]]
-        passenger_loc = (pr, pc)
-        passenger_in_taxi = False
-
-    dr, dc = LOCATIONS[LOC_NAMES[dest_idx]]
-    destination = (dr, dc)
+    layout = get_layout(env)
+    taxi_pos, passenger_loc, destination, passenger_in_taxi = decode_obs(env, obs)
 
-    return make_state(taxi_pos, passenger_loc, destination, passenger_in_taxi)
+    return make_state(taxi_pos, passenger_loc, destination, passenger_in_taxi,
+                      taxi_map=get_map(layout))
 
 
 def action_to_gym(action_name):
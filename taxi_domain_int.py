@@ -0,0 +1,240 @@
+import gtpyhop
+from functools import lru_cache
+
+import numpy as np
+
+import shared_tables
+from taxi_domain import find_path
+from taxi_grid_env import get_layout
+from taxi_map import MOVES, get_map
+
+
+# Separate gtpyhop domain, so it can sit next to the object-state 'taxi' domain
+domain = gtpyhop.Domain('taxi_int')
+
+# Column of each primitive in the successor table (its gym action)
+ACTIONS = {
+    'move_south': 0,
+    'move_north': 1,
+    'move_east': 2,
+    'move_west': 3,
+    'pickup_passenger': 4,
+    'dropoff_passenger': 5,
+}
+
+# Layout of the shared successor table files; bump it whenever _fill changes
+SUCCESSOR_TABLE_VERSION = 1
+
+
+class TaxiTables:
+    """Successor table of a layout over gym-encoded states.
+
+    successors[s][a] is the state reached by gym action a from state s, or -1
+    when the HTN primitive's precondition fails (wall, no passenger to pick up,
+    not at the destination). The table is built once with NumPy.
+    next_state(s, a) looks an entry up as a Python int: from nested lists,
+    the cheapest read for the pure-Python primitives, except on large
+    layouts, where the table is a memory-mapped file shared by all processes
+    (see shared_tables) and each lookup is a single ndarray.item call.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.num_columns = layout.num_columns
+        self.num_locs = len(layout.locs)
+        self.taxi_map = get_map(layout)
+        # States per taxi cell
+        self.cell_stride = (self.num_locs + 1) * self.num_locs
+        self.num_states = layout.num_rows * layout.num_columns * self.cell_stride
+
+        self.successors = shared_tables.table('successors', layout, (self.num_states, 6), np.int32,
+                                              self._fill, version=SUCCESSOR_TABLE_VERSION)
+        if isinstance(self.successors, np.memmap):
+            # A plain ndarray view skips the memmap subclass's per-index overhead
+            self.next_state = np.asarray(self.successors).item
+        else:
+            rows = self.successors.tolist()
+            self.next_state = lambda s, action: rows[s][action]
+
+    def _fill(self, out, chunk=1 << 20):
+        num_locs, cell_stride = self.num_locs, self.cell_stride
+        moves = self.taxi_map.moves.ravel()
+        loc_cells = np.array([row * self.num_columns + col for row, col in self.layout.locs] + [-1])
+
+        for lo in range(0, self.num_states, chunk):
+            s = np.arange(lo, min(lo + chunk, self.num_states), dtype=np.int64)
+            dest = s % num_locs
+            passenger = s // num_locs % (num_locs + 1)
+            cell = s // cell_stride
+            mask = moves[cell]
+
+            table = np.full((len(s), 6), -1, dtype=np.int32)
+            for action, (d_row, d_col, bit) in MOVES.items():
+                ok = (mask & bit) != 0
+                table[ok, action] = s[ok] + (d_row * self.num_columns + d_col) * cell_stride
+            ok = (passenger < num_locs) & (cell == loc_cells[passenger])
+            table[ok, 4] = s[ok] + (num_locs - passenger[ok]) * num_locs
+            ok = (passenger == num_locs) & (cell == loc_cells[dest])
+            table[ok, 5] = s[ok] + (dest[ok] - num_locs) * num_locs
+            out[lo:lo + len(s)] = table
+
+    def decode(self, s):
+        """(taxi cell, passenger index, destination index); passenger == num_locs means in the taxi."""
+        s, dest = divmod(s, self.num_locs)
+        cell, passenger = divmod(s, self.num_locs + 1)
+        return divmod(cell, self.num_columns), passenger, dest
+
+
+@lru_cache(maxsize=None)
+def get_tables(layout):
+    """The TaxiTables of a taxi_grid_env.TaxiLayout, built once per layout."""
+    return TaxiTables(layout)
+
+
+class IntState(gtpyhop.State):
+    """A gtpyhop state that is just the gym-encoded int.
+
+    Copying allocates one small object instead of deep-copying a dict of
+    attributes, and equality compares a single int. The object-domain
+    attributes are still readable for debugging output.
+    """
+
+    def __init__(self, s, tables, state_name='taxi_state'):
+        self.__name__ = state_name
+        self.s = s
+        self.tables = tables
+
+    def copy(self, new_name=None):
+        return IntState(self.s, self.tables, new_name or self.__name__)
+
+    def __eq__(self, other):
+        return isinstance(other, IntState) and self.s == other.s
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    @property
+    def taxi_pos(self):
+        return self.tables.decode(self.s)[0]
+
+    @property
+    def passenger_in_taxi(self):
+        return self.tables.decode(self.s)[1] == self.tables.num_locs
+
+    @property
+    def passenger_loc(self):
+        _, passenger, _ = self.tables.decode(self.s)
+        return None if passenger == self.tables.num_locs else self.tables.layout.locs[passenger]
+
+    @property
+    def destination(self):
+        return self.tables.layout.locs[self.tables.decode(self.s)[2]]
+
+
+def _apply(state, action):
+    succ = state.tables.next_state(state.s, action)
+    if succ < 0:
+        return False
+    state.s = succ
+    return state
+
+
+# gtpyhop hands every action a fresh copy, so the primitives update it in place
+
+def move_north(state):
+    return _apply(state, 1)
+
+
+def move_south(state):
+    return _apply(state, 0)
+
+
+def move_east(state):
+    return _apply(state, 2)
+
+
+def move_west(state):
+    return _apply(state, 3)
+
+
+def pickup_passenger(state):
+    return _apply(state, 4)
+
+
+def dropoff_passenger(state):
+    return _apply(state, 5)
+
+
+def m_transport_with_passenger(state):
+    if state.passenger_in_taxi:
+        return [
+            ('navigate', state.destination),
+            ('dropoff_passenger',)
+        ]
+    return False
+
+
+def m_transport_without_passenger(state):
+    if not state.passenger_in_taxi:
+        return [
+            ('get_passenger',),
+            ('deliver_passenger',)
+        ]
+    return False
+
+
+def m_get_passenger(state):
+    if state.passenger_in_taxi:
+        return False
+
+    return [
+        ('navigate', state.passenger_loc),
+        ('pickup_passenger',)
+    ]
+
+
+def m_deliver_passenger(state):
+    return [
+        ('navigate', state.destination),
+        ('dropoff_passenger',)
+    ]
+
+
+_STEP_ACTIONS = {(-1, 0): ('move_north',), (1, 0): ('move_south',),
+                 (0, 1): ('move_east',), (0, -1): ('move_west',)}
+
+
+def m_navigate_to_location(state, target_location):
+    current = state.taxi_pos
+    if current == target_location:
+        return []
+
+    path = find_path(current, target_location, state.tables.taxi_map)
+    if not path:
+        return False
+
+    return [_STEP_ACTIONS[(b[0] - a[0], b[1] - a[1])] for a, b in zip(path, path[1:])]
+
+
+def initialize_domain():
+    gtpyhop.set_current_domain(domain)
+    gtpyhop.declare_actions(
+        move_north, move_south, move_east, move_west,
+        pickup_passenger, dropoff_passenger
+    )
+
+    gtpyhop.declare_task_methods('transport',
+                                  m_transport_with_passenger,
+                                  m_transport_without_passenger)
+    gtpyhop.declare_task_methods('navigate',
+                                  m_navigate_to_location)
+    gtpyhop.declare_task_methods('get_passenger',
+                                  m_get_passenger)
+    gtpyhop.declare_task_methods('deliver_passenger',
+                                  m_deliver_passenger)
+    return domain
+
+
+def decode_gym_obs(env, obs):
+    """The observation is already the state; only the layout's tables are looked up."""
+    return IntState(int(obs), get_tables(get_layout(env)))
@@ -0,0 +1,263 @@
+from collections import namedtuple
+from functools import cached_property, lru_cache
+
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+
+from taxi_map import MOVES, get_map
+
+
+ENV_ID = 'GridTaxi-v0'
+
+TaxiLayout = namedtuple('TaxiLayout', ['num_rows', 'num_columns', 'locs', 'walls'])
+TaxiObs = namedtuple('TaxiObs', ['taxi_pos', 'passenger_loc', 'destination', 'passenger_in_taxi'])
+
+
+def layout_desc(num_rows, num_columns, walls, locs):
+    """Render a layout in the Taxi-v3 map format.
+
+    The format only has room for walls between columns, so walls between
+    rows are enforced by the environment but not drawn.
+    """
+    names = 'RGYB'
+    rows = ['+' + '-' * (2 * num_columns - 1) + '+']
+    for row in range(num_rows):
+        line = '|'
+        for col in range(num_columns):
+            if (row, col) in locs:
+                idx = locs.index((row, col))
+                line += names[idx] if idx < len(names) else str(idx % 10)
+            else:
+                line += ' '
+            if col < num_columns - 1:
+                line += '|' if ((row, col), (row, col + 1)) in walls else ':'
+        rows.append(line + '|')
+    rows.append(rows[0])
+    return rows
+
+
+@lru_cache(maxsize=None)
+def _layout_from_desc(desc_rows, locs):
+    num_rows = len(desc_rows) - 2
+    num_columns = (len(desc_rows[0]) - 1) // 2
+
+    walls = set()
+    for row in range(num_rows):
+        line = desc_rows[row + 1]
+        for col in range(num_columns - 1):
+            if line[2 * col + 2] == '|':
+                walls.add(((row, col), (row, col + 1)))
+                walls.add(((row, col + 1), (row, col)))
+
+    return TaxiLayout(num_rows, num_columns, locs, frozenset(walls))
+
+
+# Same map as gymnasium's Taxi-v3
+TAXI_V3_MAP = [
+    "+---------+",
+    "|R: | : :G|",
+    "| : | : : |",
+    "| : : : : |",
+    "| | : | : |",
+    "|Y| : |B: |",
+    "+---------+",
+]
+TAXI_V3_LAYOUT = _layout_from_desc(tuple(TAXI_V3_MAP), ((0, 0), (0, 4), (4, 0), (4, 3)))
+
+
+def get_layout(env):
+    """Layout of a Taxi-v3 or GridTaxi env, shared by both planners."""
+    unwrapped = env.unwrapped
+    layout = getattr(unwrapped, 'layout', None)
+    if layout is not None:
+        return layout
+
+    desc_rows = tuple(b''.join(line).decode('utf-8') for line in unwrapped.desc)
+    return _layout_from_desc(desc_rows, tuple(tuple(loc) for loc in unwrapped.locs))
+
+
+def decode_obs(env, obs):
+    """Decode an observation of a Taxi-v3 or GridTaxi env into positions."""
+    locs = get_layout(env).locs
+    taxi_row, taxi_col, pass_idx, dest_idx = env.unwrapped.decode(obs)
+
+    if pass_idx == len(locs):
+        passenger_loc = None
+        passenger_in_taxi = True
+    else:
+        passenger_loc = tuple(locs[pass_idx])
+        passenger_in_taxi = False
+
+    return TaxiObs((taxi_row, taxi_col), passenger_loc, tuple(locs[dest_idx]), passenger_in_taxi)
+
+
+def random_walls(num_rows, num_columns, wall_prob=0.2, seed=None):
+    """Random walls between columns, keeping at least one gap per column pair."""
+    rng = np.random.default_rng(seed)
+    walls = set()
+
+    for col in range(num_columns - 1):
+        blocked = rng.random(num_rows) < wall_prob
+        blocked[rng.integers(num_rows)] = False
+        for row in np.flatnonzero(blocked):
+            walls.add(((int(row), col), (int(row), col + 1)))
+
+    return walls
+
+
+class GridTaxiEnv(gym.Env):
+    """Taxi-v3 on an arbitrary grid.
+
+    Observations use the Taxi-v3 encoding generalised to the grid:
+    ((taxi_row * num_columns + taxi_col) * (num_locs + 1) + pass_idx) * num_locs + dest_idx,
+    with pass_idx == num_locs meaning the passenger is in the taxi. Transitions
+    are computed from a per-cell move bitmask instead of a full P table, so
+    memory grows with the number of cells rather than with states x actions.
+    """
+
+    metadata = {'render_modes': ['ansi'], 'render_fps': 4}
+
+    def __init__(self, num_rows=5, num_columns=5, walls=None, locs=None, render_mode=None, layout_file=None):
+        if layout_file is not None:
+            # A binary layout file or ASCII map (see layout_file); it replaces the other arguments
+            from layout_file import load_layout
+            self.layout = load_layout(layout_file)
+            num_rows, num_columns, locs, _ = self.layout
+        else:
+            if locs is None:
+                locs = [(0, 0), (0, num_columns - 1), (num_rows - 1, 0), (num_rows - 1, num_columns - 1)]
+            locs = tuple(tuple(loc) for loc in locs)
+
+            all_walls = set()
+            for a, b in walls or ():
+                all_walls.add((tuple(a), tuple(b)))
+                all_walls.add((tuple(b), tuple(a)))
+
+            self.layout = TaxiLayout(num_rows, num_columns, locs, frozenset(all_walls))
+
+        self.locs = list(locs)
+        self.moves = get_map(self.layout).moves
+
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.num_locs = len(locs)
+        self._loc_index = {loc: i for i, loc in enumerate(locs)}
+
+        num_states = num_rows * num_columns * (self.num_locs + 1) * self.num_locs
+        self.action_space = spaces.Discrete(6)
+        self.observation_space = spaces.Discrete(num_states)
+
+        self.render_mode = render_mode
+        self.s = 0
+        self.lastaction = None
+
+    @cached_property
+    def desc(self):
+        # Only rendering needs the text map, and drawing it takes a while on large maps
+        layout = self.layout
+        return np.asarray(layout_desc(layout.num_rows, layout.num_columns, layout.walls, layout.locs), dtype='c')
+
+    def encode(self, taxi_row, taxi_col, pass_loc, dest_idx):
+        i = taxi_row * self.num_columns + taxi_col
+        i = i * (self.num_locs + 1) + pass_loc
+        return i * self.num_locs + dest_idx
+
+    def decode(self, i):
+        dest_idx = i % self.num_locs
+        i //= self.num_locs
+        pass_loc = i % (self.num_locs + 1)
+        i //= self.num_locs + 1
+        taxi_col = i % self.num_columns
+        taxi_row = i // self.num_columns
+        assert 0 <= taxi_row < self.num_rows
+        return taxi_row, taxi_col, pass_loc, dest_idx
+
+    def transition(self, state, action):
+        """Successor, reward and termination for one action (Taxi-v3 rules)."""
+        row, col, pass_idx, dest_idx = self.decode(state)
+        reward = -1
+        terminated = False
+
+        if action in MOVES:
+            d_row, d_col, bit = MOVES[action]
+            if self.moves[row, col] & bit:
+                row += d_row
+                col += d_col
+        elif action == 4:
+            if pass_idx < self.num_locs and (row, col) == self.locs[pass_idx]:
+                pass_idx = self.num_locs
+            else:
+                reward = -10
+        elif action == 5:
+            loc_idx = self._loc_index.get((row, col))
+            if pass_idx == self.num_locs and loc_idx == dest_idx:
+                pass_idx = dest_idx
+                terminated = True
+                reward = 20
+            elif pass_idx == self.num_locs and loc_idx is not None:
+                pass_idx = loc_idx
+            else:
+                reward = -10
+
+        return self.encode(row, col, pass_idx, dest_idx), reward, terminated
+
+    def action_mask(self, state):
+        mask = np.zeros(6, dtype=np.int8)
+        row, col, pass_idx, dest_idx = self.decode(state)
+        for action, (_, _, bit) in MOVES.items():
+            if self.moves[row, col] & bit:
+                mask[action] = 1
+        if pass_idx < self.num_locs and (row, col) == self.locs[pass_idx]:
+            mask[4] = 1
+        if pass_idx == self.num_locs and (row, col) in self._loc_index:
+            mask[5] = 1
+        return mask
+
+    def step(self, a):
+        s, r, t = self.transition(self.s, int(a))
+        self.s = s
+        self.lastaction = a
+        return int(s), r, t, False, {'prob': 1.0, 'action_mask': self.action_mask(s)}
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        rng = self.np_random
+
+        row = int(rng.integers(self.num_rows))
+        col = int(rng.integers(self.num_columns))
+        pass_idx = int(rng.integers(self.num_locs))
+        dest_idx = int(rng.integers(self.num_locs - 1))
+        if dest_idx >= pass_idx:
+            dest_idx += 1
+
+        self.s = self.encode(row, col, pass_idx, dest_idx)
+        self.lastaction = None
+        return int(self.s), {'prob': 1.0, 'action_mask': self.action_mask(self.s)}
+
+    def render(self):
+        if self.render_mode == 'ansi':
+            return self._render_text()
+        gym.logger.warn(f"GridTaxiEnv does not support render_mode={self.render_mode!r}")
+
+    def _render_text(self):
+        out = [[c.decode('utf-8') for c in line] for line in self.desc.tolist()]
+        taxi_row, taxi_col, pass_idx, dest_idx = self.decode(self.s)
+
+        taxi_char = '@' if pass_idx == self.num_locs else 'T'
+        out[1 + taxi_row][2 * taxi_col + 1] = taxi_char
+        if pass_idx < self.num_locs:
+            pi, pj = self.locs[pass_idx]
+            out[1 + pi][2 * pj + 1] = 'P'
+        di, dj = self.locs[dest_idx]
+        if (di, dj) != (taxi_row, taxi_col):
+            out[1 + di][2 * dj + 1] = 'D'
+
+        text = "\n".join("".join(row) for row in out) + "\n"
+        if self.lastaction is not None:
+            text += f"  ({['South', 'North', 'East', 'West', 'Pickup', 'Dropoff'][self.lastaction]})\n"
+        return text
+
+
+if ENV_ID not in gym.registry:
+    gym.register(id=ENV_ID, entry_point='taxi_grid_env:GridTaxiEnv')
@@ -0,0 +1,100 @@
+import itertools
+from collections import defaultdict
+
+from pyperplan.grounding import (_get_statics, _create_type_map, _get_partial_state,
+                                 _create_operator, _collect_facts)
+from pyperplan.task import Task
+
+
+# Predicates whose location argument marks a pickup or destination site
+SITE_PREDICATES = ('passenger-at', 'destination')
+
+
+def default_sites(problem):
+    """Locations named by passenger facts in the initial state or goal."""
+    sites = set()
+    for atom in itertools.chain(problem.initial_state, problem.goal):
+        if atom.name in SITE_PREDICATES:
+            sites.add(atom.signature[-1][0])
+    return sites
+
+
+def _static_bindings(action, statics, static_facts):
+    """Assignments of the parameters that satisfy every static precondition.
+
+    Joins the static preconditions one at a time against the static facts of
+    the initial state, so MOVE-* is only instantiated for real adjacencies
+    instead of for every (origin, destination) pair.
+    """
+    bindings = [{}]
+    for pre in action.precondition:
+        if pre.name not in statics:
+            continue
+        params = [name for name, _ in pre.signature]
+        joined = []
+        for binding in bindings:
+            for args in static_facts[pre.name]:
+                extended = dict(binding)
+                for param, arg in zip(params, args):
+                    if extended.setdefault(param, arg) != arg:
+                        break
+                else:
+                    joined.append(extended)
+        bindings = joined
+    return bindings
+
+
+def ground_compact(problem, sites=None):
+    """Ground a taxi problem into a pyperplan Task without the full cross product.
+
+    Static preconditions (north/south/east/west/destination) are joined
+    against the initial state before any other parameter is enumerated, and
+    location parameters that no static precondition binds (PICK-UP and
+    DROP-OFF's ?loc) range over `sites` only, which defaults to the
+    passenger's pickup and destination locations. Static facts are kept out of
+    the states, as pyperplan does. The operator count stays linear in the
+    number of cells, and operators come out in a deterministic order.
+    """
+    domain = problem.domain
+    actions = list(domain.actions.values())
+    statics = set(_get_statics(domain.predicates.values(), actions))
+
+    objects = dict(problem.objects)
+    objects.update(domain.constants)
+    type_map = _create_type_map(objects)
+
+    if sites is None:
+        sites = default_sites(problem)
+    sites = set(sites)
+
+    init = _get_partial_state(problem.initial_state)
+    static_facts = defaultdict(list)
+    for atom in problem.initial_state:
+        if atom.name in statics:
+            static_facts[atom.name].append(tuple(name for name, _ in atom.signature))
+    for name in static_facts:
+        static_facts[name].sort()
+
+    operators = []
+    for action in actions:
+        for binding in _static_bindings(action, statics, static_facts):
+            free = [(name, types) for name, types in action.signature if name not in binding]
+            choices = []
+            for name, types in free:
+                candidates = set(itertools.chain(*(type_map[t] for t in types)))
+                if any(t.name == 'location' for t in types):
+                    candidates &= sites
+                choices.append([(name, obj) for obj in sorted(candidates)])
+
+            for assignment in itertools.product(*choices):
+                full = dict(binding)
+                full.update(assignment)
+                op = _create_operator(action, full, statics, init)
+                if op:
+                    operators.append(op)
+
+    goals = _get_partial_state(problem.goal)
+    facts = _collect_facts(operators) | goals
+    init &= facts
+
+    return Task(problem.name, facts, init, goals, operators)
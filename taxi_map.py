@@ -0,0 +1,170 @@
+import hashlib
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+
+# Direction bits of the per-cell move mask
+NORTH, SOUTH, EAST, WEST = 1, 2, 4, 8
+
+# Gym action -> (row delta, col delta, direction bit)
+MOVES = {
+    0: (1, 0, SOUTH),
+    1: (-1, 0, NORTH),
+    2: (0, 1, EAST),
+    3: (0, -1, WEST),
+}
+DIRECTIONS = {(d_row, d_col): bit for d_row, d_col, bit in MOVES.values()}
+
+# HTN primitive names and PDDL predicates for each direction bit
+ACTION_NAMES = {NORTH: 'move_north', SOUTH: 'move_south', EAST: 'move_east', WEST: 'move_west'}
+PDDL_PREDICATES = {NORTH: 'north', SOUTH: 'south', EAST: 'east', WEST: 'west'}
+DELTAS = {bit: (d_row, d_col) for d_row, d_col, bit in MOVES.values()}
+
+
+def compile_moves(num_rows, num_columns, walls):
+    """Per-cell bitmask of the directions the taxi may move in."""
+    moves = np.zeros((num_rows, num_columns), dtype=np.uint8)
+    moves[1:, :] |= NORTH
+    moves[:-1, :] |= SOUTH
+    moves[:, :-1] |= EAST
+    moves[:, 1:] |= WEST
+
+    for (r1, c1), (r2, c2) in walls:
+        bit = DIRECTIONS.get((r2 - r1, c2 - c1))
+        if bit is not None:
+            moves[r1, c1] &= 0xF ^ bit
+
+    return moves
+
+
+def walls_of(moves):
+    """Directed (cell, cell) walls of a move mask array; the inverse of compile_moves."""
+    num_rows, num_columns = moves.shape
+    walls = set()
+    for bit, (d_row, d_col) in DELTAS.items():
+        # Cells that have a neighbour in this direction, and whose move there is blocked
+        top, left = max(0, -d_row), max(0, -d_col)
+        inner = moves[top:num_rows - max(0, d_row), left:num_columns - max(0, d_col)]
+        rows, cols = np.nonzero((inner & bit) == 0)
+        rows, cols = (rows + top).tolist(), (cols + left).tolist()
+        walls.update(((r, c), (r + d_row, c + d_col)) for r, c in zip(rows, cols))
+    return frozenset(walls)
+
+
+class MoveWalls:
+    """The walls of a compiled move array, read from its bits instead of stored as tuples.
+
+    Stands in for a layout's frozenset of walls when the map comes already
+    compiled (see layout_file), so a large map is loaded without building
+    its wall tuples: membership tests read the mask, and hashing and
+    equality use a digest of the mask bytes. Iterating builds the tuples on
+    demand (walls_of). Only equal to another MoveWalls.
+    """
+
+    def __init__(self, moves):
+        self.moves = moves
+        digest = hashlib.sha256(repr(moves.shape).encode('utf-8'))
+        digest.update(np.ascontiguousarray(moves, dtype=np.uint8))
+        self.digest = digest.hexdigest()
+
+    def __contains__(self, wall):
+        (r1, c1), (r2, c2) = wall
+        num_rows, num_columns = self.moves.shape
+        bit = DIRECTIONS.get((r2 - r1, c2 - c1))
+        if bit is None or not (0 <= r1 < num_rows and 0 <= c1 < num_columns
+                               and 0 <= r2 < num_rows and 0 <= c2 < num_columns):
+            return False
+        return not self.moves[r1, c1] & bit
+
+    def __iter__(self):
+        return iter(walls_of(self.moves))
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        if not isinstance(other, MoveWalls):
+            return NotImplemented
+        return self.digest == other.digest
+
+
+class TaxiMap:
+    """Compiled wall layout shared by the env, the HTN domain and the PDDL problems.
+
+    `moves` is the canonical uint8 array of allowed directions per cell.
+    `masks` mirrors it as a flat Python list, because the HTN primitives and
+    BFS index single cells from pure Python, where a list read is cheaper than
+    a NumPy scalar read; it is built on first use, so code that only needs
+    the array never pays for it. Maps are immutable and shared: copying a
+    state that holds one does not copy the map.
+    """
+
+    def __init__(self, num_rows, num_columns, walls):
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.moves = compile_moves(num_rows, num_columns, walls)
+        self.moves.setflags(write=False)
+
+    @classmethod
+    def from_moves(cls, moves):
+        """A map over an already compiled (e.g. memory-mapped, read-only) move array."""
+        taxi_map = cls.__new__(cls)
+        taxi_map.num_rows, taxi_map.num_columns = moves.shape
+        taxi_map.moves = moves
+        return taxi_map
+
+    @cached_property
+    def masks(self):
+        return self.moves.ravel().tolist()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __copy__(self):
+        return self
+
+    def mask(self, pos):
+        return self.masks[pos[0] * self.num_columns + pos[1]]
+
+    def can_move(self, pos, bit):
+        return bool(self.masks[pos[0] * self.num_columns + pos[1]] & bit)
+
+    def neighbors(self, pos):
+        """(next position, direction bit) for every legal move from pos."""
+        row, col = pos
+        mask = self.masks[row * self.num_columns + col]
+        for bit in (NORTH, SOUTH, EAST, WEST):
+            if mask & bit:
+                d_row, d_col = DELTAS[bit]
+                yield (row + d_row, col + d_col), bit
+
+    @cached_property
+    def pddl_adjacency(self):
+        """(north ...)/(south ...)/(west ...)/(east ...) init facts, built once per map."""
+        lines = []
+        for i in range(self.num_rows):
+            for j in range(self.num_columns):
+                mask = self.masks[i * self.num_columns + j]
+                for bit in (NORTH, SOUTH, WEST, EAST):
+                    if mask & bit:
+                        d_row, d_col = DELTAS[bit]
+                        lines.append(f"    ({PDDL_PREDICATES[bit]} loc-{i}-{j} loc-{i + d_row}-{j + d_col})\n")
+        return "".join(lines)
+
+
+# Maps loaded already compiled (see layout_file), so get_map does not compile them again
+_PRECOMPILED = {}
+
+
+def register_map(layout, taxi_map):
+    _PRECOMPILED[layout] = taxi_map
+
+
+@lru_cache(maxsize=None)
+def get_map(layout):
+    """The TaxiMap of a taxi_grid_env.TaxiLayout, compiled once per layout."""
+    precompiled = _PRECOMPILED.get(layout)
+    if precompiled is not None:
+        return precompiled
+    return TaxiMap(layout.num_rows, layout.num_columns, layout.walls)
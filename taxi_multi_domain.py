@@ -0,0 +1,242 @@
+import copy
+import sys
+import time
+from collections import deque
+
+import gtpyhop
+import numpy as np
+
+from taxi_domain import m_navigate_to_location, move_north, move_south, move_east, move_west, prepare_navigation
+from taxi_grid_env import TAXI_V3_LAYOUT, TaxiLayout, random_walls
+from taxi_map import get_map
+
+
+domain = gtpyhop.Domain('taxi_multi')
+
+# Above this many passengers the bitmask DP (2^N * N^2) gives way to greedy insertion
+DP_LIMIT = 12
+
+UNREACHABLE = 1 << 30
+
+
+def make_state(taxi_pos, passengers, taxi_map=None):
+    """passengers maps a name to (pickup cell, destination cell). The taxi carries one at a time."""
+    state = gtpyhop.State('taxi_multi_state')
+    state.taxi_pos = taxi_pos
+    state.passenger_loc = {p: origin for p, (origin, _) in passengers.items()}
+    state.destination = {p: dest for p, (_, dest) in passengers.items()}
+    state.carrying = None
+    state.taxi_map = taxi_map if taxi_map is not None else get_map(TAXI_V3_LAYOUT)
+    return state
+
+
+def pickup_passenger(state, passenger):
+    if state.carrying is not None or state.passenger_loc[passenger] != state.taxi_pos:
+        return False
+
+    new_state = copy.deepcopy(state)
+    new_state.carrying = passenger
+    new_state.passenger_loc[passenger] = None
+    return new_state
+
+
+def dropoff_passenger(state, passenger):
+    if state.carrying != passenger or state.taxi_pos != state.destination[passenger]:
+        return False
+
+    new_state = copy.deepcopy(state)
+    new_state.carrying = None
+    new_state.passenger_loc[passenger] = state.taxi_pos
+    return new_state
+
+
+def bfs_distances(taxi_map, source):
+    """Wall-aware distance from source to every cell, as a flat list (UNREACHABLE if cut off)."""
+    num_columns = taxi_map.num_columns
+    dist = [UNREACHABLE] * (taxi_map.num_rows * num_columns)
+    dist[source[0] * num_columns + source[1]] = 0
+    queue = deque([source])
+    while queue:
+        pos = queue.popleft()
+        d = dist[pos[0] * num_columns + pos[1]] + 1
+        for (row, col), _ in taxi_map.neighbors(pos):
+            if dist[row * num_columns + col] == UNREACHABLE:
+                dist[row * num_columns + col] = d
+                queue.append((row, col))
+    return dist
+
+
+def service_costs(taxi_map, taxi_pos, requests):
+    """Cost vectors of serving requests [(pickup, destination), ...] one at a time.
+
+    first[i] is the cost of serving i first (taxi -> pickup -> destination);
+    after[j, i] the cost of serving i right after j (j's destination -> i's
+    pickup -> i's destination). Needs one BFS per distinct pickup and from
+    the taxi, rather than one per pair.
+    """
+    num_columns = taxi_map.num_columns
+    cell = lambda pos: pos[0] * num_columns + pos[1]
+
+    sources = {taxi_pos} | {origin for origin, _ in requests}
+    dist = {src: bfs_distances(taxi_map, src) for src in sources}
+
+    ride = np.array([dist[origin][cell(dest)] for origin, dest in requests], dtype=np.int64)
+    first = np.array([dist[taxi_pos][cell(origin)] for origin, _ in requests], dtype=np.int64) + ride
+    # Distances are symmetric, so dest_j -> origin_i is read from origin_i's BFS
+    after = np.array([[dist[origin][cell(dest_j)] for origin, _ in requests]
+                      for _, dest_j in requests], dtype=np.int64) + ride
+    return first, after
+
+
+def route_cost(order, first, after):
+    if not order:
+        return 0
+    return int(first[order[0]] + sum(after[a, b] for a, b in zip(order, order[1:])))
+
+
+def dp_order(first, after):
+    """Optimal service order by dynamic programming over subsets (Held-Karp)."""
+    n = len(first)
+    if n == 0:
+        return []
+    full = (1 << n) - 1
+    cost = np.full((1 << n, n), UNREACHABLE, dtype=np.int64)
+    parent = np.full((1 << n, n), -1, dtype=np.int64)
+    for i in range(n):
+        cost[1 << i, i] = first[i]
+
+    bits = 1 << np.arange(n)
+    for mask in range(1, full):
+        # Best way to extend this subset by each passenger i, from every possible last passenger j
+        candidates = cost[mask][:, None] + after
+        best_last = candidates.argmin(axis=0)
+        best = candidates[best_last, np.arange(n)]
+        for i in np.flatnonzero((mask & bits) == 0):
+            succ = mask | bits[i]
+            if best[i] < cost[succ, i]:
+                cost[succ, i] = best[i]
+                parent[succ, i] = best_last[i]
+
+    last = int(cost[full].argmin())
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    order.reverse()
+    return order
+
+
+def greedy_order(first, after):
+    """Cheapest-insertion service order: repeatedly insert the request that adds the least cost."""
+    n = len(first)
+    order = []
+    remaining = list(range(n))
+    while remaining:
+        best = None
+        for i in remaining:
+            for k in range(len(order) + 1):
+                prev_cost = first[i] if k == 0 else after[order[k - 1], i]
+                if k < len(order):
+                    nxt = order[k]
+                    old = first[nxt] if k == 0 else after[order[k - 1], nxt]
+                    delta = prev_cost + after[i, nxt] - old
+                else:
+                    delta = prev_cost
+                if best is None or delta < best[0]:
+                    best = (delta, i, k)
+        _, i, k = best
+        order.insert(k, i)
+        remaining.remove(i)
+    return order
+
+
+def service_order(state, method=None):
+    """Passengers still waiting, in the order to serve them ('dp', 'greedy' or 'given')."""
+    waiting = [p for p in state.passenger_loc if state.passenger_loc[p] is not None
+               and state.passenger_loc[p] != state.destination[p]]
+    if method is None:
+        method = 'dp' if len(waiting) <= DP_LIMIT else 'greedy'
+    if method == 'given' or len(waiting) < 2:
+        return waiting
+
+    # m_serve_all drops a carried passenger off first, so the others are served from there
+    start = state.taxi_pos if state.carrying is None else state.destination[state.carrying]
+    first, after = service_costs(state.taxi_map, start,
+                                 [(state.passenger_loc[p], state.destination[p]) for p in waiting])
+    order = dp_order(first, after) if method == 'dp' else greedy_order(first, after)
+    return [waiting[i] for i in order]
+
+
+def m_serve_all(state, method=None):
+    # A passenger already in the taxi is dropped off before anyone else is picked up
+    tasks = []
+    if state.carrying is not None:
+        tasks += [('navigate', state.destination[state.carrying]),
+                  ('dropoff_passenger', state.carrying)]
+    return tasks + [('serve', p) for p in service_order(state, method)]
+
+
+def m_serve(state, passenger):
+    if state.passenger_loc[passenger] is None:
+        return False
+    return [
+        ('navigate', state.passenger_loc[passenger]),
+        ('pickup_passenger', passenger),
+        ('navigate', state.destination[passenger]),
+        ('dropoff_passenger', passenger)
+    ]
+
+
+def initialize_domain():
+    gtpyhop.set_current_domain(domain)
+    gtpyhop.declare_actions(
+        move_north, move_south, move_east, move_west,
+        pickup_passenger, dropoff_passenger
+    )
+
+    gtpyhop.declare_task_methods('serve_all', m_serve_all)
+    gtpyhop.declare_task_methods('serve', m_serve)
+    gtpyhop.declare_task_methods('navigate', m_navigate_to_location)
+    return domain
+
+
+def random_passengers(layout, count, rng):
+    cells = [(r, c) for r in range(layout.num_rows) for c in range(layout.num_columns)]
+    picks = rng.choice(len(cells), size=(count, 2))
+    return {f"p{i}": (cells[a], cells[b]) for i, (a, b) in enumerate(picks) if a != b}
+
+
+def benchmark(counts=(2, 4, 6, 8, 10, 12, 16, 24, 32), size=10, trials=5, seed=0):
+    """Plan cost and planning time of each ordering method as the passenger count grows."""
+    initialize_domain()
+    gtpyhop.set_verbose_level(0)
+    layout = TaxiLayout(size, size, (), frozenset(
+        w for a, b in random_walls(size, size, seed=seed) for w in ((a, b), (b, a))))
+    taxi_map = get_map(layout)
+    prepare_navigation(taxi_map)
+    rng = np.random.default_rng(seed)
+
+    print(f"{'Passengers':>10} {'Method':<8} {'Cost':>8} {'Order ms':>9} {'Plan ms':>9}")
+    for count in counts:
+        problems = [((int(rng.integers(size)), int(rng.integers(size))),
+                     random_passengers(layout, count, rng)) for _ in range(trials)]
+        methods = ['given', 'greedy'] + (['dp'] if count <= DP_LIMIT else [])
+        for method in methods:
+            cost = order_ms = plan_ms = 0.0
+            for taxi_pos, passengers in problems:
+                state = make_state(taxi_pos, passengers, taxi_map)
+                start = time.perf_counter()
+                service_order(state, method)
+                order_ms += (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                plan = gtpyhop.find_plan(state, [('serve_all', method)])
+                plan_ms += (time.perf_counter() - start) * 1000
+                cost += len(plan)
+            print(f"{count:>10} {method:<8} {cost / trials:>8.1f} {order_ms / trials:>9.2f} "
+                  f"{plan_ms / trials:>9.2f}")
+
+
+if __name__ == '__main__':
+    benchmark(size=int(sys.argv[1]) if len(sys.argv) > 1 else 10)
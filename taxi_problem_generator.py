@@ -1,5 +1,19 @@
-def create_problem_file(grid_size, problem_id, taxi_pos, passenger_start, goal_pos):
-    locations = [f"loc-{i}-{j}" for i in range(grid_size) for j in range(grid_size)]
+def create_problem_file(grid_size, problem_id, taxi_pos, passenger_start, goal_pos, layout=None):
+    """PDDL problem on an open grid_size x grid_size grid, or on layout's walls if given.
+
+    layout is a taxi_grid_env.TaxiLayout or the path of a layout file (see
+    layout_file); grid_size is then ignored.
+    """
+    if layout is not None:
+        # Only layouts need numpy and gymnasium; open grids keep this module dependency-free
+        from layout_file import load_layout
+        from taxi_map import get_map
+        if isinstance(layout, str):
+            layout = load_layout(layout)
+        num_rows, num_columns = layout.num_rows, layout.num_columns
+    else:
+        num_rows = num_columns = grid_size
+    locations = [f"loc-{i}-{j}" for i in range(num_rows) for j in range(num_columns)]
 
     problem = f"""(define (problem taxi-problem-{problem_id})
     (:domain taxi)
@@ -15,15 +29,18 @@ def create_problem_file(grid_size, problem_id, taxi_pos, passenger_start, goal_p
         (destination passenger1 {goal_pos})
     """
 
-    for i in range(grid_size):
-        for j in range(grid_size):
-            if j < grid_size - 1:
-                problem += f"   (east loc-{i}-{j} loc-{i}-{j+1})\n"
-                problem += f"   (west loc-{i}-{j+1} loc-{i}-{j})\n"
+    if layout is not None:
+        problem += get_map(layout).pddl_adjacency
+    else:
+        for i in range(grid_size):
+            for j in range(grid_size):
+                if j < grid_size - 1:
+                    problem += f"   (east loc-{i}-{j} loc-{i}-{j+1})\n"
+                    problem += f"   (west loc-{i}-{j+1} loc-{i}-{j})\n"
 
-            if i < grid_size - 1:
-                problem += f"   (south loc-{i}-{j} loc-{i+1}-{j})\n"
-                problem += f"   (north loc-{i+1}-{j} loc-{i}-{j})\n"
+                if i < grid_size - 1:
+                    problem += f"   (south loc-{i}-{j} loc-{i+1}-{j})\n"
+                    problem += f"   (north loc-{i+1}-{j} loc-{i}-{j})\n"
 
 
     problem += """  )
@@ -0,0 +1,133 @@
+import json
+import struct
+import sys
+import time
+from collections import namedtuple
+
+import gymnasium as gym
+import taxi_grid_env  # registers GridTaxi-v0 for replay
+
+
+MAGIC = b'TXTR\x01'
+
+# Episode header: tag, seed (-1 = None), initial obs, strategy / env id / env kwargs lengths
+EPISODE = struct.Struct('<cqIBBH')
+# Step: tag, obs after the step, gym action, reward, planning latency (s), flags
+STEP = struct.Struct('<cIBhfB')
+
+TERMINATED, TRUNCATED = 1, 2
+
+Step = namedtuple('Step', ['obs', 'action', 'reward', 'latency', 'terminated', 'truncated'])
+Episode = namedtuple('Episode', ['strategy', 'seed', 'env_id', 'env_kwargs', 'initial_obs', 'steps'])
+ReplayResult = namedtuple('ReplayResult', ['strategy', 'seed', 'steps', 'env_time',
+                                           'planning_time', 'mismatches'])
+
+
+class TrajectoryRecorder:
+    """Append-only binary log of every step the acting loops take.
+
+    Each episode is a header (strategy, seed, env id and kwargs, initial obs)
+    followed by 13-byte step records. The log is flushed at the end of every
+    episode, so a crash loses at most the episode in progress and leaves at
+    most one partial record at the end, which the reader drops.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def start_episode(self, strategy, seed, env_id, env_kwargs, obs):
+        strategy = strategy.encode('utf-8')
+        env_id = env_id.encode('utf-8')
+        kwargs = json.dumps(env_kwargs or {}, default=sorted).encode('utf-8')
+        self.file.write(EPISODE.pack(b'E', -1 if seed is None else seed, int(obs),
+                                     len(strategy), len(env_id), len(kwargs)))
+        self.file.write(strategy + env_id + kwargs)
+
+    def step(self, obs, action, reward, latency, terminated, truncated):
+        flags = (TERMINATED if terminated else 0) | (TRUNCATED if truncated else 0)
+        self.file.write(STEP.pack(b'S', int(obs), int(action), int(reward), latency, flags))
+
+    def end_episode(self):
+        # Hand the episode to the OS, so a crash later in the run cannot lose it
+        self.flush()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_episodes(path):
+    """Yield the episodes of a log one at a time."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trajectory log")
+
+        episode = None
+        while True:
+            tag = f.read(1)
+            if tag == b'S' and episode is not None:
+                record = f.read(STEP.size - 1)
+                if len(record) < STEP.size - 1:
+                    break
+                _, obs, action, reward, latency, flags = STEP.unpack(tag + record)
+                episode.steps.append(Step(obs, action, reward, latency,
+                                          bool(flags & TERMINATED), bool(flags & TRUNCATED)))
+            elif tag == b'E':
+                header = f.read(EPISODE.size - 1)
+                if len(header) < EPISODE.size - 1:
+                    break
+                _, seed, obs, n_strategy, n_env, n_kwargs = EPISODE.unpack(tag + header)
+                names = f.read(n_strategy + n_env + n_kwargs)
+                if len(names) < n_strategy + n_env + n_kwargs:
+                    break
+                if episode is not None:
+                    yield episode
+                episode = Episode(names[:n_strategy].decode('utf-8'),
+                                  None if seed == -1 else seed,
+                                  names[n_strategy:n_strategy + n_env].decode('utf-8'),
+                                  json.loads(names[n_strategy + n_env:]),
+                                  obs, [])
+            else:
+                break
+
+        if episode is not None:
+            yield episode
+
+
+def replay(path, verify=True):
+    """Re-run every logged episode against its env with no planner in the loop.
+
+    Returns one ReplayResult per episode: env_time is the time spent in
+    reset/step, planning_time the latency recorded when the log was written,
+    and mismatches the steps whose obs or reward differ from the log.
+    """
+    results = []
+    for episode in read_episodes(path):
+        env = gym.make(episode.env_id, **episode.env_kwargs)
+        mismatches = 0
+
+        start = time.perf_counter()
+        obs, _ = env.reset(seed=episode.seed)
+        if verify and obs != episode.initial_obs:
+            mismatches += 1
+        for step in episode.steps:
+            obs, reward, terminated, truncated, _ = env.step(step.action)
+            if verify and (obs != step.obs or reward != step.reward):
+                mismatches += 1
+        env_time = time.perf_counter() - start
+        env.close()
+
+        results.append(ReplayResult(episode.strategy, episode.seed, len(episode.steps), env_time,
+                                    sum(step.latency for step in episode.steps), mismatches))
+    return results
+
+
+if __name__ == '__main__':
+    for r in replay(sys.argv[1]):
+        print(f"{r.strategy:<30} seed={r.seed!s:>5} steps={r.steps:4d} env={r.env_time:8.4f}s "
+              f"planning={r.planning_time:8.4f}s mismatches={r.mismatches}")
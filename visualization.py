@@ -2,6 +2,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+from streaming_stats import LatencyHistogram
+
 
 # Load your results
 def load_and_combine_results():
@@ -231,6 +233,42 @@ def plot_episode_trends(df):
 
 
 
+# CHART 6: Plan Call Latency Histograms
+
+def plot_latency_histograms(df):
+    """Merged per-plan-call latency histogram of each strategy, with its p99"""
+    if 'Plan_Latencies' not in df:
+        print("No Plan_Latencies column in the results, skipping the latency histograms")
+        return
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    for strategy in df['Strategy'].unique():
+        hist = LatencyHistogram()
+        for text in df.loc[df['Strategy'] == strategy, 'Plan_Latencies']:
+            hist.merge(LatencyHistogram.decode(text))
+        if not hist.total:
+            continue
+
+        # Bucket i spans [bounds[i-1], bounds[i]); the open-ended ends are drawn one bucket wide
+        step = hist.bounds[1] / hist.bounds[0]
+        edges = [hist.bounds[0] / step] + hist.bounds + [hist.bounds[-1] * step]
+        fractions = np.array(hist.counts) / hist.total
+        line = ax.stairs(fractions, edges, label=f"{strategy} ({hist.total} calls)", linewidth=2)
+        ax.axvline(hist.quantile(0.99), color=line.get_edgecolor(), linestyle='--', alpha=0.7)
+
+    ax.set_xscale('log')
+    ax.set_xlabel('Planning latency per plan call (s)', fontsize=12)
+    ax.set_ylabel('Fraction of plan calls', fontsize=12)
+    ax.set_title('Plan Call Latency Distribution (dashed: p99)', fontsize=14, fontweight='bold')
+    ax.legend(fontsize=9)
+    ax.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig('latency_histograms.png', dpi=300, bbox_inches='tight')
+    plt.show()
+
+
 df = load_and_combine_results()
 
 print("Generating Charts comparison")
@@ -242,6 +280,7 @@ plot_radar_chart(df)
 plot_overhead_vs_success(df)
 plot_grouped_metrics(df)
 plot_episode_trends(df)
+plot_latency_histograms(df)
 
 
 print("SUMMARY STATISTICS")
@@ -0,0 +1,209 @@
+import csv
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from htn_executor import evaluate_strategy
+from streaming_stats import METRICS
+from sweep_runner import SWEEP_HEADER, code_hash, grid_label, make_strategy, plan_cells
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    cell TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    shard INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    PRIMARY KEY (shard, seed)
+);
+"""
+
+
+class WorkQueue:
+    """Seed shards of a sweep in an SQLite file on a shared filesystem.
+
+    A shard is one sweep_runner cell. Workers on any host claim shards
+    inside a write transaction, so two workers never get the same one, and
+    write each episode as it finishes. A claim whose heartbeat is older than
+    `lease` seconds is treated as a dead worker and handed out again; the
+    new owner resumes after the seeds already recorded.
+    """
+
+    def __init__(self, path, lease=600.0):
+        self.path = path
+        self.lease = lease
+        self.db = sqlite3.connect(path, timeout=120, isolation_level=None)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row and row[0]
+
+    def add_sweep(self, config):
+        """Queue every cell of a sweep config; a queue holds one sweep."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._meta('code') is not None:
+                raise ValueError(f"{self.path} already holds a sweep")
+            self.db.execute("INSERT INTO meta VALUES ('code', ?)", (code_hash(),))
+            self.db.execute("INSERT INTO meta VALUES ('config', ?)", (json.dumps(config),))
+            self.db.executemany("INSERT INTO shards (cell) VALUES (?)",
+                                [(json.dumps(cell, sort_keys=True),) for cell in plan_cells(config)])
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def claim(self, worker):
+        """Atomically take the next pending (or abandoned) shard: (id, cell) or None."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT id, cell FROM shards WHERE status = 'pending' "
+                "OR (status = 'claimed' AND heartbeat < ?) ORDER BY id LIMIT 1",
+                (time.time() - self.lease,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE shards SET status = 'claimed', worker = ?, heartbeat = ?, "
+                                "attempts = attempts + 1 WHERE id = ?", (worker, time.time(), row[0]))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def done_seeds(self, shard):
+        return {seed for seed, in self.db.execute("SELECT seed FROM results WHERE shard = ?", (shard,))}
+
+    def record(self, shard, seed, row):
+        """Store one episode row and renew the shard's lease."""
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (shard, seed, json.dumps(row)))
+        self.db.execute("UPDATE shards SET heartbeat = ? WHERE id = ?", (time.time(), shard))
+        self.db.execute("COMMIT")
+
+    def complete(self, shard):
+        self.db.execute("UPDATE shards SET status = 'done', heartbeat = ? WHERE id = ?", (time.time(), shard))
+
+    def progress(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM shards GROUP BY status"))
+
+    def rows(self):
+        """Every recorded row, in shard (plan) order and then seed order."""
+        for row, in self.db.execute("SELECT row FROM results ORDER BY shard, seed"):
+            yield json.loads(row)
+
+
+class _ShardWriter:
+    """csv.writer stand-in that records evaluate_strategy's rows in the queue."""
+
+    def __init__(self, queue, shard, cell):
+        self.queue = queue
+        self.shard = shard
+        self.extra = [grid_label(cell['grid']), cell['variant']]
+
+    def writerow(self, row):
+        row = [v.item() if isinstance(v, np.generic) else v for v in row] + self.extra
+        # Episode numbers are seed + 1
+        self.queue.record(self.shard, row[1] - 1, row)
+
+
+def run_worker(path, worker=None, lease=600.0):
+    """Claim and run shards until the queue is drained. Returns the shards run."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(path, lease)
+    if queue._meta('code') != code_hash():
+        raise RuntimeError(f"{path} was filled from different code than this worker runs")
+
+    shards = 0
+    try:
+        while True:
+            claimed = queue.claim(worker)
+            if claimed is None:
+                return shards
+            shard, cell = claimed
+
+            # Partial results of a previous owner: seeds run in order, so resume after the last one
+            done = queue.done_seeds(shard)
+            first_seed = cell['first_seed'] + len(done)
+            remaining = cell['num_episodes'] - len(done)
+
+            if remaining > 0:
+                executor, strategy_func = make_strategy(cell)
+                evaluate_strategy(executor, cell['strategy'], strategy_func,
+                                  num_episodes=remaining, verbose_first=False,
+                                  writer=_ShardWriter(queue, shard, cell), keep_results=False,
+                                  first_seed=first_seed)
+            queue.complete(shard)
+            shards += 1
+    finally:
+        queue.close()
+
+
+def merge(path, csv_path, npz_path=None):
+    """Write the queue's results as one CSV in seed order, and optionally as columns (.npz)."""
+    queue = WorkQueue(path)
+    progress = queue.progress()
+    if set(progress) - {'done'}:
+        print(f"Warning: merging an unfinished queue {progress}")
+
+    columns = {name: [] for name in SWEEP_HEADER}
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SWEEP_HEADER)
+        for row in queue.rows():
+            writer.writerow(row)
+            if npz_path:
+                for name, value in zip(SWEEP_HEADER, row):
+                    columns[name].append(value)
+    queue.close()
+
+    if npz_path:
+        np.savez(npz_path, **{name: np.asarray(values, dtype=float if name in METRICS else None)
+                              for name, values in columns.items()})
+
+
+def _usage():
+    print("usage: python work_queue.py init QUEUE_DB SWEEP_JSON\n"
+          "       python work_queue.py work QUEUE_DB [LOCAL_PROCESSES]\n"
+          "       python work_queue.py merge QUEUE_DB RESULTS_CSV [RESULTS_NPZ]")
+    sys.exit(2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        _usage()
+    command, path = sys.argv[1], sys.argv[2]
+
+    if command == 'init':
+        with open(sys.argv[3]) as f:
+            config = json.load(f)
+        WorkQueue(path).add_sweep(config)
+    elif command == 'work':
+        # Several local processes stand in for several hosts sharing the file
+        processes = [multiprocessing.Process(target=run_worker, args=(path,))
+                     for _ in range(int(sys.argv[3]) if len(sys.argv) > 3 else 1)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+    elif command == 'merge':
+        merge(path, sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+    else:
+        _usage()